@@ -0,0 +1,57 @@
+"""Run the Discord bot as its own process, separate from the API.
+
+Start the API with BOT_RUN_MODE=process so it doesn't start a bot of its own;
+it then serves /api/bot/status and /api/bot/guilds from the snapshots this
+worker publishes to the bot_status collection every BOT_STATUS_INTERVAL
+seconds:
+
+    python bot_worker.py
+
+With PROFILING_ENABLED=true, SIGUSR1 writes a sampled profile of this worker
+to PROFILE_DIR (the API's /api/admin/profile only covers the API process).
+"""
+import asyncio
+import os
+import signal
+
+from pymongo.errors import PyMongoError
+
+os.environ['BOT_RUN_MODE'] = 'process'
+
+import server  # noqa: E402
+
+
+async def dump_profile():
+    print(f"Profile written: {await asyncio.to_thread(server.write_profile, 10)}")
+
+
+async def main():
+    if not server.DISCORD_TOKEN:
+        print("Discord token not provided")
+        return
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(server.bot.close()))
+    if server.PROFILING_ENABLED:
+        loop.add_signal_handler(signal.SIGUSR1, lambda: asyncio.create_task(dump_profile()))
+
+    await server.ensure_indexes(server.db)
+    await server.backfill_server_stats(server.db)
+    try:
+        async with server.bot:
+            await server.bot.start(server.DISCORD_TOKEN)
+    finally:
+        server.cancel_weekly_reports()
+        # Flush first: with Mongo down, queued moderation writes still reach the journal
+        await server.flush_buffers(server.db)
+        # Let the API see this worker go away instead of waiting for the snapshot to expire
+        try:
+            await server.db.bot_status.update_one({"_id": server.BOT_INSTANCE_ID}, {"$set": {"ready": False}})
+        except PyMongoError as e:
+            print(f"Failed to mark this worker stopped: {e}")
+        server.client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,48 +1,356 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, OperationFailure, PyMongoError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any, Annotated
 import uuid
-from datetime import datetime, timedelta
-from bson import ObjectId
+from datetime import date, datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from bson import ObjectId, json_util
 import discord
 from discord.ext import commands, tasks
+import aiohttp
 import asyncio
+import bisect
+import csv
+import functools
+import hashlib
+import hmac
+import io
 import json
 import threading
 import re
+import sys
+import time
+import traceback
+import base64
+import heapq
+import math
+import zlib
+import unicodedata
+
+try:
+    import orjson
+except ImportError:  # optional; FastJSONResponse falls back to the json module
+    orjson = None
 
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# How the Discord bot runs next to the API: "thread" gives the gateway its own
+# event loop in a background thread, "loop" runs it as a task on the API's loop,
+# "process" leaves it to bot_worker.py and serves bot state from its snapshots
+BOT_RUN_MODE = os.environ.get('BOT_RUN_MODE', 'thread')
+
+# Metrics
+#
+# In-process instruments rendered in the Prometheus text format at /api/metrics.
+# Observations arrive from the bot and API threads, so every metric has a lock.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[tuple]:
+        """(suffix, labels, value) for every series"""
+        with self._lock:
+            return [("", self._labels(key), value) for key, value in self._values.items()]
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[tuple]:
+        return [("_total", labels, value) for _, labels, value in super().samples()]
+
+class GaugeMetric(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[tuple]:
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        
+        samples = []
+        for key, counts, total in series:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", {**labels, "le": _format_metric_value(bound)}, cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> CounterMetric:
+        return self._register(CounterMetric(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> GaugeMetric:
+        return self._register(GaugeMetric(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """Plain (BSON-serializable) families, as rendered or published in bot snapshots"""
+        return [
+            {"name": metric.name, "type": metric.kind, "help": metric.documentation,
+             "samples": [list(sample) for sample in metric.samples()]}
+            for metric in self._metrics.values()
+        ]
+
+def _format_metric_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_metrics(*sources) -> str:
+    """Prometheus text exposition of ``(extra_labels, families)`` pairs, merged by metric name"""
+    families: Dict[str, Dict[str, Any]] = {}
+    for extra_labels, collected in sources:
+        for family in collected:
+            merged = families.setdefault(family["name"], {**family, "samples": []})
+            merged["samples"].extend(
+                (suffix, {**labels, **extra_labels}, value) for suffix, labels, value in family["samples"]
+            )
+    
+    lines = []
+    for name, family in families.items():
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for suffix, labels, value in family["samples"]:
+            label_text = ",".join(f'{label}="{_escape_label(str(label_value))}"' for label, label_value in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {_format_metric_value(value)}" if label_text
+                         else f"{name}{suffix} {_format_metric_value(value)}")
+    return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+ON_MESSAGE_SECONDS = metrics.histogram("bot_on_message_seconds", "on_message handling time by phase", ["phase"])
+MONGO_COMMAND_SECONDS = metrics.histogram("mongo_command_seconds", "MongoDB command latency", ["collection", "command"])
+MONGO_COMMAND_FAILURES = metrics.counter("mongo_command_failures", "Failed MongoDB commands", ["collection", "command"])
+DISCORD_HTTP_SECONDS = metrics.histogram("discord_http_request_seconds", "Discord REST API call latency", ["method", "route", "status"])
+DISCORD_RATE_LIMITED = metrics.counter("discord_http_rate_limited", "Discord REST responses with status 429", ["method", "route"])
+TASK_SECONDS = metrics.histogram("bot_task_seconds", "Background task run duration", ["task"])
+GATEWAY_LATENCY = metrics.gauge("discord_gateway_latency_seconds", "Gateway heartbeat latency per shard", ["shard"])
+API_REQUEST_SECONDS = metrics.histogram("api_request_seconds", "API request handling time", ["method", "route", "status"])
+LOOP_LAG_SECONDS = metrics.histogram("event_loop_lag_seconds", "How late a periodic callback ran on each event loop", ["loop"])
+EVENT_STREAM_DROPPED = metrics.counter("event_stream_dropped", "Live events dropped because a subscriber fell behind", ["event"])
+SLOW_HANDLERS = metrics.counter("slow_handlers", "Event handlers and commands slower than SLOW_HANDLER_THRESHOLD", ["handler"])
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command by collection"""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event):
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _labels(self, event) -> Dict[str, str]:
+        return {"collection": self._collections.pop((event.connection_id, event.request_id), ""), "command": event.command_name}
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **self._labels(event))
+
+    def failed(self, event):
+        labels = self._labels(event)
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, **labels)
+        MONGO_COMMAND_FAILURES.inc(**labels)
+
+_DISCORD_ROUTE_PARAMS = [
+    (re.compile(r"/\d{15,}"), "/{id}"),
+    # Interaction and webhook tokens are credentials and unique per call
+    (re.compile(r"^(/(?:interactions|webhooks)/\{id\})/[^/]+"), r"\1/{token}"),
+    (re.compile(r"/reactions/[^/]+"), "/reactions/{emoji}"),
+]
+
+def discord_route(path: str) -> str:
+    """Collapse snowflakes, tokens and emoji in a Discord API path so routes make bounded label values"""
+    path = re.sub(r"^/api/v\d+", "", path)
+    for pattern, replacement in _DISCORD_ROUTE_PARAMS:
+        path = pattern.sub(replacement, path)
+    return path
+
+def discord_http_trace() -> aiohttp.TraceConfig:
+    """aiohttp tracing hooks that time Discord REST calls and count 429s"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        route = discord_route(params.url.path)
+        DISCORD_HTTP_SECONDS.observe(time.perf_counter() - context.start, method=params.method, route=route, status=params.response.status)
+        if params.response.status == 429:
+            DISCORD_RATE_LIMITED.inc(method=params.method, route=route)
+
+    async def on_request_exception(session, context, params):
+        DISCORD_HTTP_SECONDS.observe(time.perf_counter() - context.start, method=params.method, route=discord_route(params.url.path), status="error")
+
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    return trace
+
+def timed_task(name: str):
+    """Record each run of a background task in TASK_SECONDS"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with TASK_SECONDS.time(task=name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+mongo_metrics = MongoCommandMetrics()
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_metrics])
 db = client[os.environ['DB_NAME']]
 
-# Create a separate client for API endpoints
-api_client = AsyncIOMotorClient(mongo_url)
+# Create a separate client for API endpoints when the bot has its own event loop
+api_client = client if BOT_RUN_MODE == 'loop' else AsyncIOMotorClient(mongo_url, event_listeners=[mongo_metrics])
 api_db = api_client[os.environ['DB_NAME']]
 
 # Discord Bot Configuration
 DISCORD_TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
 DISCORD_BOT_ID = os.environ.get('DISCORD_BOT_ID')
 
+# Sharding: DISCORD_SHARD_IDS ("0,1") with DISCORD_SHARD_COUNT gives this process an
+# explicit slice of shards; DISCORD_AUTO_SHARD=true lets discord.py pick the count
+DISCORD_SHARD_COUNT = int(os.environ['DISCORD_SHARD_COUNT']) if os.environ.get('DISCORD_SHARD_COUNT') else None
+DISCORD_SHARD_IDS = [int(shard_id) for shard_id in os.environ['DISCORD_SHARD_IDS'].split(',')] if os.environ.get('DISCORD_SHARD_IDS') else None
+DISCORD_AUTO_SHARD = os.environ.get('DISCORD_AUTO_SHARD', 'false').lower() == 'true'
+
+# Bot worker snapshots (BOT_RUN_MODE=process)
+BOT_INSTANCE_ID = os.environ.get('BOT_INSTANCE_ID') or (
+    'shards-' + '-'.join(map(str, DISCORD_SHARD_IDS)) if DISCORD_SHARD_IDS else 'bot'
+)
+BOT_STATUS_INTERVAL = float(os.environ.get('BOT_STATUS_INTERVAL', '15'))
+
+# Settings cache configuration
+SETTINGS_CACHE_TTL = float(os.environ.get('SETTINGS_CACHE_TTL', '300'))
+SETTINGS_CHANGE_STREAM = os.environ.get('SETTINGS_CHANGE_STREAM', 'false').lower() == 'true'
+# How often a bot worker (BOT_RUN_MODE=process) polls for settings the API wrote, when the change stream is off
+SETTINGS_POLL_INTERVAL = float(os.environ.get('SETTINGS_POLL_INTERVAL', '5'))
+
+# Member activity write-behind configuration
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '5'))
+ACTIVITY_MAX_PENDING = int(os.environ.get('ACTIVITY_MAX_PENDING', '5000'))
+
+# Moderation writes: batched off the gateway handlers, journaled to disk while Mongo is unreachable
+PERSISTENCE_FLUSH_INTERVAL = float(os.environ.get('PERSISTENCE_FLUSH_INTERVAL', '1'))
+# One journal per bot instance: a replay rewrites or removes the file, so processes must never share one
+PERSISTENCE_JOURNAL = Path(os.environ.get('PERSISTENCE_JOURNAL', ROOT_DIR / 'journal' / f'moderation-{BOT_INSTANCE_ID}.jsonl'))
+
+# Guild statistics cache window (seconds)
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '30'))
+
+# Concurrent "Active Member" role grants
+ROLE_GRANT_WORKERS = int(os.environ.get('ROLE_GRANT_WORKERS', '4'))
+
+# Weekly reports in flight at once (sends are also spread across the hour)
+WEEKLY_REPORT_CONCURRENCY = int(os.environ.get('WEEKLY_REPORT_CONCURRENCY', '10'))
+
+# Live strike/action streams: events buffered per dashboard connection, and
+# seconds between keep-alive comments on an idle stream
+EVENT_STREAM_BUFFER = int(os.environ.get('EVENT_STREAM_BUFFER', '100'))
+EVENT_STREAM_HEARTBEAT = float(os.environ.get('EVENT_STREAM_HEARTBEAT', '15'))
+
+# Opt-in profiling: event-loop lag monitors, slow handler logging and sampled
+# profiles written to PROFILE_DIR through the admin API (only while ADMIN_API_TOKEN is set)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true'
+SLOW_HANDLER_THRESHOLD = float(os.environ.get('SLOW_HANDLER_THRESHOLD', '0.5'))
+LOOP_LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', '0.25'))
+PROFILE_DIR = Path(os.environ.get('PROFILE_DIR', ROOT_DIR / 'profiles'))
+ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN')
+
 # Bot intents and setup
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+if DISCORD_AUTO_SHARD or DISCORD_SHARD_COUNT or DISCORD_SHARD_IDS:
+    bot = commands.AutoShardedBot(
+        command_prefix='!',
+        intents=intents,
+        shard_count=DISCORD_SHARD_COUNT,
+        shard_ids=DISCORD_SHARD_IDS,
+        http_trace=discord_http_trace()
+    )
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents, http_trace=discord_http_trace())
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -61,6 +369,7 @@ class BotSettings(BaseModel):
     quiet_hours_enabled: bool = True
     quiet_start: str = "22:00"
     quiet_end: str = "08:00"
+    timezone: str = "UTC"  # IANA name used for quiet hours, e.g. "Asia/Riyadh"
     strike_limit: int = 3
     auto_timeout_enabled: bool = True
     welcome_message_ar: str = "مرحباً {mention}! أهلاً وسهلاً بك في خادمنا 🎉"
@@ -117,14 +426,15 @@ class ModAction(BaseModel):
         json_encoders = {ObjectId: str}
 
 class ServerStats(BaseModel):
+    """Per-guild counters for one UTC day, maintained incrementally by StatsRollup"""
     id: str = Field(default_factory=lambda: str(ObjectId()), alias="_id")
     guild_id: str
-    total_members: int
-    new_members_week: int
-    total_strikes: int
-    mod_actions_week: int
-    messages_today: int
-    active_users: int
+    date: str  # YYYY-MM-DD
+    messages_today: int = 0
+    active_users: int = 0
+    joins: int = 0
+    strikes: int = 0
+    mod_actions: int = 0
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
@@ -132,40 +442,1330 @@ class ServerStats(BaseModel):
         arbitrary_types_allowed = True
         json_encoders = {ObjectId: str}
 
+# Hot-path documents
+#
+# The gateway handlers build strike and moderation documents directly, with
+# native ObjectIds, instead of validating a Pydantic model and converting it
+# with .dict() per event. The models above remain the schema at the API
+# boundary, so these builders must produce the same fields.
+def strike_document(user_id: str, guild_id: str, reason: str, moderator_id: str) -> Dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "user_id": user_id,
+        "guild_id": guild_id,
+        "reason": reason,
+        "moderator_id": moderator_id,
+        "timestamp": datetime.utcnow()
+    }
+
+def mod_action_document(action: str, target_id: str, moderator_id: str, reason: str, guild_id: str,
+                        duration: Optional[int] = None) -> Dict[str, Any]:
+    return {
+        "_id": ObjectId(),
+        "action": action,
+        "target_id": target_id,
+        "moderator_id": moderator_id,
+        "reason": reason,
+        "duration": duration,
+        "guild_id": guild_id,
+        "timestamp": datetime.utcnow()
+    }
+
+# Indexes
+INDEXES = {
+    "members": [
+        ([("guild_id", ASCENDING), ("user_id", ASCENDING)], {"unique": True}),
+        ([("guild_id", ASCENDING), ("user_id", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("guild_id", ASCENDING), ("join_date", ASCENDING)], {}),
+    ],
+    "strikes": [
+        ([("guild_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+    ],
+    "mod_actions": [
+        ([("guild_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+    ],
+    "bot_settings": [
+        ([("guild_id", ASCENDING)], {"unique": True}),
+        ([("updated_at", ASCENDING)], {}),
+    ],
+    "server_stats": [
+        ([("guild_id", ASCENDING), ("date", ASCENDING)], {"unique": True}),
+    ],
+    "weekly_reports": [
+        ([("guild_id", ASCENDING)], {"unique": True}),
+    ],
+}
+
+async def merge_duplicate_members(database) -> int:
+    """Fold duplicate member documents into one per (guild_id, user_id); returns how many were removed.
+
+    Before the unique index existed every join inserted a new document, while
+    counters were only ever updated on one of them. Counters are summed,
+    dates take the latest value and the newest username is kept.
+    """
+    removed = 0
+    pipeline = [
+        {"$group": {"_id": {"guild_id": "$guild_id", "user_id": "$user_id"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    async for group in database.members.aggregate(pipeline, allowDiskUse=True):
+        docs = await database.members.find({"_id": {"$in": group['ids']}}).to_list(length=None)
+        docs.sort(key=lambda doc: doc.get('join_date') or datetime.min)
+        merged = {
+            "username": docs[-1].get('username'),
+            "strike_count": sum(doc.get('strike_count') or 0 for doc in docs),
+            "total_messages": sum(doc.get('total_messages') or 0 for doc in docs),
+            "join_date": docs[-1].get('join_date'),
+            "last_active": max((doc['last_active'] for doc in docs if doc.get('last_active')), default=None),
+        }
+        if any(doc.get('active_role_granted') for doc in docs):
+            merged["active_role_granted"] = True
+        
+        await database.members.update_one({"_id": docs[0]['_id']}, {"$set": merged})
+        await database.members.delete_many({"_id": {"$in": [doc['_id'] for doc in docs[1:]]}})
+        removed += len(docs) - 1
+    return removed
+
+# Unique indexes whose duplicates can be merged automatically
+DUPLICATE_MERGERS = {
+    "members": merge_duplicate_members,
+}
+
+async def ensure_indexes(database):
+    """Create the indexes the bot and API queries rely on (no-op when they exist)"""
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await database[collection_name].create_index(keys, **options)
+            except OperationFailure as e:
+                if options.get('unique') and e.code == 11000:
+                    await _ensure_unique_over_duplicates(database, collection_name, keys, options, e)
+                else:
+                    print(f"Failed to create index {keys} on {collection_name}: {e}")
+            except PyMongoError as e:
+                print(f"Failed to create index {keys} on {collection_name}: {e}")
+
+async def _ensure_unique_over_duplicates(database, collection_name: str, keys, options: Dict[str, Any], error: PyMongoError):
+    """Merge the duplicates left from before a unique index and retry; failing that, index without uniqueness"""
+    merge = DUPLICATE_MERGERS.get(collection_name)
+    if merge:
+        print(f"Merged {await merge(database)} duplicate {collection_name} documents")
+        try:
+            await database[collection_name].create_index(keys, **options)
+            return
+        except PyMongoError as e:
+            error = e
+    
+    # Without any index on these keys every lookup and upsert would scan the collection
+    print(f"WARNING: unique index {keys} on {collection_name} could not be built, "
+          f"falling back to a non-unique index; duplicates remain: {error}")
+    try:
+        await database[collection_name].create_index(keys, **{k: v for k, v in options.items() if k != 'unique'})
+    except PyMongoError as e:
+        print(f"Failed to create index {keys} on {collection_name}: {e}")
+
+# Guild settings cache
+class SettingsCache:
+    """In-process cache of bot_settings documents keyed by guild_id.
+
+    Entries expire after ``ttl`` seconds and are dropped explicitly whenever
+    settings are written, so steady-state reads never reach Mongo. An expired
+    entry is still served while it is refreshed in the background, and kept
+    if the refresh fails, so only guilds with no entry at all wait on Mongo.
+    """
+
+    def __init__(self, collection, ttl: float = 300):
+        self.collection = collection
+        self.ttl = ttl
+        self._entries: Dict[str, tuple] = {}
+        self._version = 0
+        self._listeners = []
+        self._refreshing: Dict[str, asyncio.Task] = {}
+
+    async def get(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(guild_id)
+        if entry is None:
+            return await self._read(guild_id)
+        
+        if entry[0] <= time.monotonic() and guild_id not in self._refreshing:
+            task = asyncio.create_task(self._refresh(guild_id))
+            self._refreshing[guild_id] = task
+            task.add_done_callback(lambda _: self._refreshing.pop(guild_id, None))
+        return entry[1]
+
+    async def _refresh(self, guild_id: str):
+        try:
+            await self._read(guild_id)
+        except PyMongoError as e:
+            print(f"Serving stale settings for guild {guild_id}: {e}")
+
+    async def _read(self, guild_id: str) -> Optional[Dict[str, Any]]:
+        version = self._version
+        settings = await self.collection.find_one({"guild_id": guild_id})
+        # Don't resurrect a value that was invalidated while we were reading
+        if version == self._version:
+            self.set(guild_id, settings)
+        return settings
+
+    def set(self, guild_id: str, settings: Optional[Dict[str, Any]]):
+        self._entries[guild_id] = (time.monotonic() + self.ttl, settings)
+
+    def invalidate(self, guild_id: Optional[str] = None):
+        self._version += 1
+        if guild_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(guild_id, None)
+        self.notify(guild_id)
+
+    def add_listener(self, callback):
+        """Register ``callback(guild_id)`` to run when settings change (None means every guild)"""
+        self._listeners.append(callback)
+
+    def notify(self, guild_id: Optional[str] = None):
+        for callback in self._listeners:
+            callback(guild_id)
+
+settings_cache = SettingsCache(db.bot_settings, ttl=SETTINGS_CACHE_TTL)
+settings_watch_task = None
+
+class GuildVersions:
+    """Per-guild change counters behind the dashboard ETags.
+
+    Counters live in memory, so tags also carry a per-process boot id and
+    never match a tag handed out before a restart.
+    """
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex
+        self._epoch = 0
+        self._versions: Dict[str, int] = {}
+
+    def bump(self, guild_id: Optional[str] = None):
+        if guild_id is None:
+            self._epoch += 1
+        else:
+            self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+
+    def get(self, guild_id: str) -> str:
+        return f"{self.boot_id}.{self._epoch}.{self._versions.get(guild_id, 0)}"
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"boot_id": self.boot_id, "epoch": self._epoch, "versions": dict(self._versions)}
+
+guild_versions = GuildVersions()
+settings_cache.add_listener(guild_versions.bump)
+
+class EventSubscriber:
+    def __init__(self, max_buffered: int):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffered)
+        self.dropped = 0
+        self.closed = False
+
+class EventBroker:
+    """Fans strikes and moderation actions out to per-guild stream subscribers.
+
+    ``publish`` may be called from any thread; delivery hops onto each
+    subscriber's loop. A full buffer drops its oldest event, and a subscriber
+    that falls a whole buffer behind is sent an ``overflow`` event and
+    disconnected, so one slow dashboard never holds events for the others.
+    """
+
+    def __init__(self, max_buffered: int = 100):
+        self.max_buffered = max_buffered
+        self._subscribers: Dict[str, set] = {}
+
+    def subscribe(self, guild_id: str) -> EventSubscriber:
+        subscriber = EventSubscriber(self.max_buffered)
+        self._subscribers.setdefault(guild_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, guild_id: str, subscriber: EventSubscriber):
+        subscriber.closed = True
+        subscribers = self._subscribers.get(guild_id)
+        if subscribers:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                self._subscribers.pop(guild_id, None)
+
+    def publish(self, guild_id: str, event: str, document: Dict[str, Any]):
+        subscribers = self._subscribers.get(guild_id)
+        if not subscribers:
+            return
+        
+        # Encoded once for every subscriber
+        data = json.dumps(jsonable_encoder(document, custom_encoder={ObjectId: str}), ensure_ascii=False)
+        message = f"event: {event}\ndata: {data}\n\n"
+        for subscriber in list(subscribers):
+            subscriber.loop.call_soon_threadsafe(self._deliver, subscriber, event, message)
+
+    def _deliver(self, subscriber: EventSubscriber, event: str, message: str):
+        if subscriber.closed:
+            return
+        if subscriber.queue.empty():
+            # Caught up; only drops since the buffer was last drained count towards a disconnect
+            subscriber.dropped = 0
+        elif subscriber.queue.full():
+            subscriber.queue.get_nowait()
+            subscriber.dropped += 1
+            EVENT_STREAM_DROPPED.inc(event=event)
+            if subscriber.dropped >= self.max_buffered:
+                self._overflow(subscriber)
+                return
+        subscriber.queue.put_nowait(message)
+
+    def _overflow(self, subscriber: EventSubscriber):
+        if subscriber.closed:
+            return
+        subscriber.closed = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait("event: overflow\ndata: {}\n\n")
+        subscriber.queue.put_nowait(None)
+
+    def overflow_all(self):
+        """Send every subscriber ``overflow`` and disconnect it, e.g. after events may have been missed"""
+        for subscribers in list(self._subscribers.values()):
+            for subscriber in list(subscribers):
+                subscriber.loop.call_soon_threadsafe(self._overflow, subscriber)
+
+event_broker = EventBroker(max_buffered=EVENT_STREAM_BUFFER)
+
+async def watch_settings_changes():
+    """Keep the settings cache fresh from a change stream (requires a replica set).
+
+    A failed stream is reopened with exponential backoff, resuming after the
+    last change it delivered. When there is no usable resume token, changes
+    made while it was down are unknown, so the whole cache is dropped.
+    """
+    resume_token = None
+    delay = 1
+    while True:
+        try:
+            async with db.bot_settings.watch(full_document='updateLookup', resume_after=resume_token) as stream:
+                delay = 1
+                async for change in stream:
+                    document = change.get('fullDocument')
+                    if document and document.get('guild_id'):
+                        settings_cache.set(document['guild_id'], document)
+                        settings_cache.notify(document['guild_id'])
+                    else:
+                        # Deletes only carry the _id, so drop everything
+                        settings_cache.invalidate()
+                    resume_token = stream.resume_token
+        except OperationFailure as e:
+            # Usually the resume point fell off the oplog
+            print(f"Settings change stream failed, restarting without resuming in {delay}s: {e}")
+            resume_token = None
+        except Exception as e:
+            print(f"Settings change stream stopped, retrying in {delay}s: {e}")
+        
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+        if resume_token is None:
+            settings_cache.invalidate()
+
+# Newest updated_at applied by poll_settings_changes, and the guilds written at that instant
+_settings_polled_at = None
+_settings_polled_guilds: set = set()
+
+@tasks.loop(seconds=SETTINGS_POLL_INTERVAL)
+async def poll_settings_changes():
+    """Apply settings the API process wrote since the last poll (BOT_RUN_MODE=process without a change stream)"""
+    global _settings_polled_at, _settings_polled_guilds
+    try:
+        if _settings_polled_at is None:
+            # Settings written before the first poll are read when the cache is primed
+            newest = await db.bot_settings.find_one({"updated_at": {"$ne": None}}, {"updated_at": True}, sort=[("updated_at", DESCENDING)])
+            _settings_polled_at = newest['updated_at'] if newest else datetime.min
+            return
+        
+        async for document in db.bot_settings.find({"updated_at": {"$gte": _settings_polled_at}}).sort("updated_at", ASCENDING):
+            if document['updated_at'] == _settings_polled_at and document['guild_id'] in _settings_polled_guilds:
+                continue
+            if document['updated_at'] != _settings_polled_at:
+                _settings_polled_at, _settings_polled_guilds = document['updated_at'], set()
+            _settings_polled_guilds.add(document['guild_id'])
+            settings_cache.set(document['guild_id'], document)
+            settings_cache.notify(document['guild_id'])
+    except PyMongoError as e:
+        print(f"Failed to poll settings changes: {e}")
+
+# Forbidden word matching
+_IGNORED_CHARS_RE = re.compile(r'[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640\u200b-\u200f]')
+_ARABIC_LETTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+})
+_TOKEN_RE = re.compile(r'\w+')
+
+def normalize_text(text: str) -> str:
+    """Fold case, compatibility forms, Arabic diacritics/tatweel and letter variants"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = _IGNORED_CHARS_RE.sub('', text)
+    return text.translate(_ARABIC_LETTER_MAP)
+
+class ForbiddenWordMatcher:
+    """Whole-word matcher compiled once from a guild's forbidden_words list.
+
+    Plain words and phrases are looked up as token n-grams in a set, so a
+    message is checked in time proportional to its length rather than to the
+    size of the blocklist. Terms containing punctuation fall back to a single
+    compiled alternation anchored on word boundaries, and terms made only of
+    symbols or emoji (no word characters) match anywhere. Matching is on whole
+    words only, so Arabic words with an attached prefix (الكلمة, وكلمة) do
+    not match the bare word (كلمة); list those forms separately.
+    """
+
+    def __init__(self, words: List[str]):
+        self.words = tuple(words)
+        self._phrases = set()
+        self._max_tokens = 0
+        patterns = []
+        symbols = []
+
+        for word in self.words:
+            normalized = normalize_text(word).strip()
+            if not normalized:
+                continue
+            tokens = _TOKEN_RE.findall(normalized)
+            if not tokens:
+                # Emoji and symbols have no word boundaries; they match anywhere
+                symbols.append(re.escape(normalized))
+            elif ' '.join(tokens) == ' '.join(normalized.split()):
+                self._phrases.add(' '.join(tokens))
+                self._max_tokens = max(self._max_tokens, len(tokens))
+            else:
+                patterns.append(re.escape(normalized))
+
+        self._pattern = None
+        alternatives = []
+        if patterns:
+            patterns.sort(key=len, reverse=True)
+            alternatives.append(r'(?<!\w)(?:' + '|'.join(patterns) + r')(?!\w)')
+        if symbols:
+            symbols.sort(key=len, reverse=True)
+            alternatives.append('|'.join(symbols))
+        if alternatives:
+            self._pattern = re.compile('|'.join(alternatives))
+
+    def match(self, content: str) -> bool:
+        normalized = normalize_text(content)
+
+        if self._phrases:
+            tokens = _TOKEN_RE.findall(normalized)
+            if not self._phrases.isdisjoint(tokens):
+                return True
+            for size in range(2, self._max_tokens + 1):
+                for i in range(len(tokens) - size + 1):
+                    if ' '.join(tokens[i:i + size]) in self._phrases:
+                        return True
+
+        return bool(self._pattern and self._pattern.search(normalized))
+
+_forbidden_matchers: Dict[str, tuple] = {}
+
+def get_forbidden_matcher(guild_id: str, words: List[str]) -> ForbiddenWordMatcher:
+    """Return the guild's compiled matcher, rebuilding it only when the word list changes"""
+    cached = _forbidden_matchers.get(guild_id)
+    # Cached settings hand back the same list object until they are reloaded
+    if cached and cached[0] is words:
+        return cached[1]
+
+    if cached and cached[1].words == tuple(words):
+        matcher = cached[1]
+    else:
+        matcher = ForbiddenWordMatcher(words)
+    _forbidden_matchers[guild_id] = (words, matcher)
+    return matcher
+
+# Write-behind buffers
+class WriteBehindBuffer(ABC):
+    """Base for in-memory counters flushed to Mongo by a background task.
+
+    Subclasses keep their state in ``_pending`` and implement ``flush``, which
+    returns the keys it wrote. The flush runs at most ``flush_interval``
+    seconds apart, or sooner once ``max_pending`` keys are waiting, and
+    listeners are awaited with the written keys after each background flush.
+    """
+
+    name = "write-behind"
+
+    def __init__(self, collection, flush_interval: float = 5, max_pending: int = 5000):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[tuple, Any] = {}
+        self._flush_task = None
+        self._wakeup = None
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Register ``await callback(keys)`` to run after each background flush"""
+        self._listeners.append(callback)
+
+    def _check_pending(self):
+        if len(self._pending) >= self.max_pending and self._wakeup:
+            self._wakeup.set()
+
+    def start(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                with TASK_SECONDS.time(task=f"{self.name} flush"):
+                    keys = await self.flush()
+                for callback in self._listeners:
+                    await callback(keys)
+            except Exception as e:
+                print(f"{self.name} flush failed: {e}")
+
+    @abstractmethod
+    async def flush(self, collection=None) -> List[tuple]:
+        """Write out ``_pending`` through ``collection`` (default: the buffer's own) and return the keys written"""
+
+class ActivityBuffer(WriteBehindBuffer):
+    """Coalesces per-member message counters and flushes them with bulk_write.
+
+    Each flush issues one upsert per (guild_id, user_id) seen since the last
+    flush.
+    """
+
+    name = "Activity"
+
+    def __init__(self, collection, flush_interval: float = 5, max_pending: int = 5000):
+        super().__init__(collection, flush_interval, max_pending)
+        self.events = 0
+        self.flushed_events = 0
+        self.operations = 0
+        self.flushes = 0
+
+    def record(self, guild_id: str, user_id: str, when: Optional[datetime] = None):
+        when = when or datetime.utcnow()
+        entry = self._pending.get((guild_id, user_id))
+        if entry:
+            entry[0] += 1
+            entry[1] = when
+        else:
+            self._pending[(guild_id, user_id)] = [1, when]
+        self.events += 1
+        self._check_pending()
+
+    async def flush(self, collection=None) -> List[tuple]:
+        """Write pending counters; ``collection`` overrides the target (e.g. from another loop)"""
+        if not self._pending:
+            return []
+
+        batch, self._pending = self._pending, {}
+        keys = list(batch)
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "guild_id": guild_id},
+                {
+                    "$inc": {"total_messages": batch[(guild_id, user_id)][0]},
+                    "$set": {"last_active": batch[(guild_id, user_id)][1]}
+                },
+                upsert=True
+            )
+            for guild_id, user_id in keys
+        ]
+
+        try:
+            await (collection or self.collection).bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            self._merge({keys[i]: batch[keys[i]] for i in failed})
+            raise
+        except Exception:
+            self._merge(batch)
+            raise
+
+        self.flushed_events += sum(count for count, _ in batch.values())
+        self.operations += len(operations)
+        self.flushes += 1
+        return keys
+
+    def _merge(self, batch: Dict[tuple, list]):
+        """Put counters from a failed flush back so the next flush retries them"""
+        for key, (count, last_active) in batch.items():
+            entry = self._pending.get(key)
+            if entry:
+                entry[0] += count
+                entry[1] = max(entry[1], last_active)
+            else:
+                self._pending[key] = [count, last_active]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "pending_members": len(self._pending),
+            "flushes": self.flushes,
+            "operations": self.operations,
+            "coalescing_ratio": round(self.flushed_events / self.operations, 2) if self.operations else None
+        }
+
+activity_buffer = ActivityBuffer(db.members, flush_interval=ACTIVITY_FLUSH_INTERVAL, max_pending=ACTIVITY_MAX_PENDING)
+
+class StatsRollup(WriteBehindBuffer):
+    """Maintains per-guild, per-day ServerStats counters as events happen.
+
+    Counters are merged in memory per (guild_id, date) and folded into
+    ``server_stats`` with ``$inc`` upserts. Active users are de-duplicated
+    in memory for the current day, so a restart mid-day can count a member
+    twice.
+    """
+
+    name = "Stats rollup"
+
+    def __init__(self, collection, flush_interval: float = 5, max_pending: int = 5000):
+        super().__init__(collection, flush_interval, max_pending)
+        self._active_date = None
+        self._active_users: Dict[str, set] = {}
+
+    def record(self, guild_id: str, field: str, amount: int = 1, when: Optional[datetime] = None):
+        date = (when or datetime.utcnow()).strftime('%Y-%m-%d')
+        counters = self._pending.setdefault((guild_id, date), {})
+        counters[field] = counters.get(field, 0) + amount
+        self._check_pending()
+
+    def record_message(self, guild_id: str, user_id: str, when: Optional[datetime] = None):
+        when = when or datetime.utcnow()
+        date = when.strftime('%Y-%m-%d')
+        if date != self._active_date:
+            self._active_date = date
+            self._active_users = {}
+
+        self.record(guild_id, 'messages_today', when=when)
+        active = self._active_users.setdefault(guild_id, set())
+        if user_id not in active:
+            active.add(user_id)
+            self.record(guild_id, 'active_users', when=when)
+
+    async def flush(self, collection=None) -> List[tuple]:
+        if not self._pending:
+            return []
+
+        batch, self._pending = self._pending, {}
+        keys = list(batch)
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"guild_id": guild_id, "date": date},
+                {
+                    "$inc": batch[(guild_id, date)],
+                    "$set": {"timestamp": now},
+                    "$setOnInsert": {"_id": str(ObjectId())}
+                },
+                upsert=True
+            )
+            for guild_id, date in keys
+        ]
+
+        try:
+            await (collection or self.collection).bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error['index'] for error in e.details.get('writeErrors', [])}
+            self._merge({keys[i]: batch[keys[i]] for i in failed})
+            raise
+        except Exception:
+            self._merge(batch)
+            raise
+        return keys
+
+    def _merge(self, batch: Dict[tuple, Dict[str, int]]):
+        for key, counters in batch.items():
+            pending = self._pending.setdefault(key, {})
+            for field, amount in counters.items():
+                pending[field] = pending.get(field, 0) + amount
+
+stats_rollup = StatsRollup(db.server_stats, flush_interval=ACTIVITY_FLUSH_INTERVAL)
+
+async def bump_rollup_versions(keys: List[tuple]):
+    for guild_id in {guild_id for guild_id, _ in keys}:
+        guild_versions.bump(guild_id)
+
+stats_rollup.add_listener(bump_rollup_versions)
+
+class PersistenceWriter(WriteBehindBuffer):
+    """Moderation writes queued by the gateway handlers and applied in batches.
+
+    Each flush sends one insert_many per collection for inserts and one
+    bulk_write for updates. While Mongo is unreachable, writes are appended
+    to ``journal`` (one MongoDB extended JSON line each) and replayed, oldest
+    first, before the next batch once Mongo is back. A batch may have
+    landed even though its acknowledgement was lost, so every write must be
+    safe to apply twice: inserts carry their _id, so replays skip the
+    duplicates, and updates must not be relative ($inc and the like).
+    Flushes return the guild ids they wrote.
+    """
+
+    name = "Persistence"
+    REPLAY_BATCH = 1000
+
+    def __init__(self, database, journal: Path, flush_interval: float = 1, max_pending: int = 1000):
+        # Writes name their collection, so this buffer holds a database rather than one collection
+        super().__init__(None, flush_interval, max_pending)
+        self.database = database
+        self.journal = journal
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = asyncio.Lock()
+        self.spilled = 0
+        self.replayed = 0
+
+    def insert(self, collection: str, document: Dict[str, Any]):
+        self._pending.append({"op": "insert", "collection": collection, "document": document})
+        self._check_pending()
+
+    def update(self, collection: str, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False):
+        self._pending.append({"op": "update", "collection": collection, "filter": filter, "update": update, "upsert": upsert})
+        self._check_pending()
+
+    async def flush(self, database=None) -> List[str]:
+        # on_ready flushes alongside the background task; two replays of one journal would apply it twice
+        async with self._lock:
+            return await self._flush(database if database is not None else self.database)
+
+    async def _flush(self, database) -> List[str]:
+        batch, self._pending = self._pending, []
+        guilds: set = set()
+        unsaved = batch
+        try:
+            # Journaled writes go first; while they can't be replayed, new ones queue behind them on disk
+            if not self.journal.exists() or await self._replay(database, guilds):
+                unsaved = await self._apply(database, batch, guilds)
+            await self._spill(unsaved)
+        except Exception:
+            # e.g. the journal can't be written; keep the unapplied writes in memory for the next flush
+            self._pending[:0] = unsaved
+            raise
+        return sorted(guilds)
+
+    async def _apply(self, database, writes: List[Dict[str, Any]], guilds: set) -> List[Dict[str, Any]]:
+        """Apply ``writes`` grouped by operation and collection; returns those left unapplied because Mongo is unreachable"""
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for write in writes:
+            groups.setdefault((write['op'], write['collection']), []).append(write)
+        
+        grouped = list(groups.items())
+        for i, ((op, name), group) in enumerate(grouped):
+            try:
+                if op == "insert":
+                    await database[name].insert_many([write['document'] for write in group], ordered=False)
+                else:
+                    await database[name].bulk_write(
+                        [UpdateOne(write['filter'], write['update'], upsert=write['upsert']) for write in group],
+                        ordered=False
+                    )
+            except ConnectionFailure as e:
+                print(f"{self.name} writes deferred, Mongo unreachable: {e}")
+                return [write for _, rest in grouped[i:] for write in rest]
+            except BulkWriteError as e:
+                errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != 11000]
+                if errors:
+                    print(f"{self.name} dropped {len(errors)} writes to {name}: {errors[0].get('errmsg')}")
+            except PyMongoError as e:
+                print(f"{self.name} dropped {len(group)} writes to {name}: {e}")
+                continue
+            guilds.update((write.get('document') or write.get('filter'))['guild_id'] for write in group)
+        return []
+
+    async def _spill(self, writes: List[Dict[str, Any]]):
+        if writes:
+            await asyncio.to_thread(self._write_journal, writes, 'a')
+            self.spilled += len(writes)
+
+    def _write_journal(self, writes: List[Dict[str, Any]], mode: str):
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        path = self.journal if mode == 'a' else self.journal.with_suffix('.tmp')
+        with open(path, mode, encoding='utf-8') as f:
+            if mode == 'a' and f.tell() and not self._ends_with_newline():
+                # A crash cut the last append short; don't glue the next write onto it
+                f.write("\n")
+            for write in writes:
+                f.write(json_util.dumps(write) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if path != self.journal:
+            os.replace(path, self.journal)
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.journal, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _read_journal(self) -> List[Dict[str, Any]]:
+        """Parse the journal, moving lines that don't parse (torn by a crash mid-append) to a .corrupt file"""
+        writes, corrupt = [], []
+        for line in self.journal.read_text(encoding='utf-8', errors='replace').splitlines():
+            if not line.strip():
+                continue
+            try:
+                writes.append(json_util.loads(line))
+            except ValueError:
+                corrupt.append(line)
+        if corrupt:
+            with open(self.journal.with_suffix('.corrupt'), 'a', encoding='utf-8') as f:
+                f.write("\n".join(corrupt) + "\n")
+            print(f"{self.name} journal: moved {len(corrupt)} unreadable lines to {self.journal.with_suffix('.corrupt')}")
+        return writes
+
+    async def _replay(self, database, guilds: set) -> bool:
+        writes = await asyncio.to_thread(self._read_journal)
+        for start in range(0, len(writes), self.REPLAY_BATCH):
+            remaining = await self._apply(database, writes[start:start + self.REPLAY_BATCH], guilds)
+            if remaining:
+                # Drop what already landed so a later replay doesn't apply it twice
+                await asyncio.to_thread(self._write_journal, remaining + writes[start + self.REPLAY_BATCH:], 'w')
+                return False
+        
+        await asyncio.to_thread(self.journal.unlink)
+        self.replayed += len(writes)
+        print(f"Replayed {len(writes)} journaled writes")
+        return True
+
+persistence_writer = PersistenceWriter(db, PERSISTENCE_JOURNAL, flush_interval=PERSISTENCE_FLUSH_INTERVAL)
+
+async def bump_written_versions(guild_ids: List[str]):
+    for guild_id in guild_ids:
+        guild_versions.bump(guild_id)
+
+persistence_writer.add_listener(bump_written_versions)
+
+class StrikeCounts:
+    """Members' strike counts for the guilds this process moderates.
+
+    Each guild is loaded once from members.strike_count; after that this
+    process is the only writer of its guilds' counts, so punishments are
+    decided from memory while the increments are persisted in the background.
+    Strikes must only be counted for a guild once ``load`` has returned for
+    it, otherwise the loaded value would miss them or count them twice.
+    """
+
+    def __init__(self):
+        self._counts: Dict[tuple, int] = {}
+        self._loaded: set = set()
+        self._loading: Dict[str, asyncio.Future] = {}
+
+    async def load(self, database, guild_ids: List[str]):
+        """Load the guilds' counts, waiting for loads of them already in progress"""
+        missing = [guild_id for guild_id in guild_ids if guild_id not in self._loaded and guild_id not in self._loading]
+        if missing:
+            task = asyncio.ensure_future(self._read(database, missing))
+            for guild_id in missing:
+                self._loading[guild_id] = task
+            # A failed load is retried by the next caller
+            task.add_done_callback(lambda _: [self._loading.pop(guild_id, None) for guild_id in missing])
+        
+        pending = {self._loading[guild_id] for guild_id in guild_ids if guild_id in self._loading}
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _read(self, database, guild_ids: List[str]):
+        async for doc in database.members.find(
+            {"guild_id": {"$in": guild_ids}, "strike_count": {"$gt": 0}},
+            {"guild_id": True, "user_id": True, "strike_count": True, "_id": False}
+        ):
+            self._counts[(doc['guild_id'], doc['user_id'])] = doc['strike_count']
+        self._loaded.update(guild_ids)
+
+    def increment(self, guild_id: str, user_id: str) -> int:
+        key = (guild_id, user_id)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        return self._counts[key]
+
+strike_counts = StrikeCounts()
+
+# Guild statistics
+class StatsEngine:
+    """Computes a guild's moderation counters in one concurrent batch.
+
+    Shared by /api/bot/stats, the !stats command and the weekly report.
+    Weekly figures are summed from the last seven ServerStats rollups rather
+    than counted from raw documents. Results are cached for ``ttl`` seconds
+    so polling dashboards don't re-run the queries on every request; callers
+    that tag the result pass ``version`` so a change is never served from a
+    cache entry computed before it.
+    """
+
+    def __init__(self, database, ttl: float = 30):
+        self.database = database
+        self.ttl = ttl
+        self._cache: Dict[str, tuple] = {}
+
+    async def get(self, guild_id: str, version: Optional[str] = None) -> Dict[str, Any]:
+        cached = self._cache.get(guild_id)
+        if cached and cached[0] > time.monotonic() and (version is None or cached[2] == version):
+            return cached[1]
+
+        stats = await self._compute(guild_id)
+        self._cache[guild_id] = (time.monotonic() + self.ttl, stats, version)
+        return stats
+
+    async def history(self, guild_id: str, start: str, end: str) -> List[Dict[str, Any]]:
+        """Daily rollups for ``start``..``end`` inclusive (YYYY-MM-DD), oldest first"""
+        return await self.database.server_stats.find(
+            {"guild_id": guild_id, "date": {"$gte": start, "$lte": end}},
+            {"_id": 0}
+        ).sort("date", 1).to_list(length=None)
+
+    async def weekly_totals(self, guild_ids: List[str]) -> Dict[str, Dict[str, int]]:
+        """Joins, strikes and mod actions over the last seven days for many guilds in one aggregation"""
+        now = datetime.utcnow()
+        pipeline = [
+            {"$match": {
+                "guild_id": {"$in": guild_ids},
+                "date": {"$gte": (now - timedelta(days=6)).strftime('%Y-%m-%d'), "$lte": now.strftime('%Y-%m-%d')}
+            }},
+            {"$group": {
+                "_id": "$guild_id",
+                "joins": {"$sum": "$joins"},
+                "strikes": {"$sum": "$strikes"},
+                "mod_actions": {"$sum": "$mod_actions"}
+            }}
+        ]
+        totals = await self.database.server_stats.aggregate(pipeline).to_list(length=None)
+        return {row.pop('_id'): row for row in totals}
+
+    async def _compute(self, guild_id: str) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        today = now.strftime('%Y-%m-%d')
+        week_start = (now - timedelta(days=6)).strftime('%Y-%m-%d')
+
+        total_members, total_strikes, days = await asyncio.gather(
+            self.database.members.count_documents({"guild_id": guild_id}),
+            self.database.strikes.count_documents({"guild_id": guild_id}),
+            self.history(guild_id, week_start, today)
+        )
+        today_stats = next((day for day in days if day['date'] == today), {})
+
+        return {
+            "total_members": total_members,
+            "new_members_week": sum(day.get('joins', 0) for day in days),
+            "total_strikes": total_strikes,
+            "strikes_week": sum(day.get('strikes', 0) for day in days),
+            "mod_actions_week": sum(day.get('mod_actions', 0) for day in days),
+            "messages_today": today_stats.get('messages_today', 0),
+            "active_users": today_stats.get('active_users', 0),
+            "timestamp": now
+        }
+
+# Rollup counters that can be rebuilt from raw documents: (collection, date field, counter)
+BACKFILLED_COUNTERS = [
+    ("members", "join_date", "joins"),
+    ("strikes", "timestamp", "strikes"),
+    ("mod_actions", "timestamp", "mod_actions"),
+]
+
+async def backfill_server_stats(database, days: int = 366):
+    """Rebuild joins/strikes/mod_actions rollups for the last ``days`` days from raw documents, once.
+
+    Rollups only count events recorded since they were introduced, so older
+    days (and the partial day of the upgrade) would read as zero. Counts are
+    applied with $max, keeping whichever of the raw count and the rollup is
+    larger (rejoins overwrite join_date, so raw joins can be the smaller),
+    and running this twice (API and worker starting together) changes nothing.
+    """
+    if await database.migrations.find_one({"_id": "server_stats_backfill"}):
+        return
+    
+    started = time.perf_counter()
+    since = datetime.utcnow() - timedelta(days=days)
+    now = datetime.utcnow()
+    for collection_name, date_field, counter in BACKFILLED_COUNTERS:
+        rows = await database[collection_name].aggregate([
+            {"$match": {date_field: {"$gte": since}}},
+            {"$group": {
+                "_id": {"guild_id": "$guild_id", "date": {"$dateToString": {"format": "%Y-%m-%d", "date": f"${date_field}"}}},
+                "count": {"$sum": 1}
+            }}
+        ]).to_list(length=None)
+        operations = [
+            UpdateOne(
+                {"guild_id": row['_id']['guild_id'], "date": row['_id']['date']},
+                {"$max": {counter: row['count']}, "$setOnInsert": {"_id": str(ObjectId()), "timestamp": now}},
+                upsert=True
+            )
+            for row in rows
+        ]
+        for start in range(0, len(operations), 1000):
+            await database.server_stats.bulk_write(operations[start:start + 1000], ordered=False)
+    
+    await database.migrations.update_one(
+        {"_id": "server_stats_backfill"}, {"$set": {"completed_at": datetime.utcnow()}}, upsert=True
+    )
+    print(f"Backfilled server_stats rollups in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+# In thread mode the bot and the API run on different event loops, so each gets its own engine
+stats_engine = StatsEngine(db, ttl=STATS_CACHE_TTL)
+api_stats_engine = stats_engine if BOT_RUN_MODE == 'loop' else StatsEngine(api_db, ttl=STATS_CACHE_TTL)
+
+# Strikes
+def record_strike(user_id: str, guild_id: str, reason: str, moderator_id: str) -> int:
+    """Count a strike in memory and queue its writes; returns the member's new strike count"""
+    strike = strike_document(user_id, guild_id, reason, moderator_id)
+    count = strike_counts.increment(guild_id, user_id)
+    persistence_writer.insert("strikes", strike)
+    # The absolute count under $max, unlike $inc, can be replayed after a write that landed without an acknowledgement
+    persistence_writer.update("members", {"user_id": user_id, "guild_id": guild_id}, {"$max": {"strike_count": count}}, upsert=True)
+    event_broker.publish(guild_id, "strike", strike)
+    return count
+
+def log_mod_action(mod_action: Dict[str, Any]):
+    """Queue a moderation action (see mod_action_document) and count it in the daily rollup"""
+    persistence_writer.insert("mod_actions", mod_action)
+    event_broker.publish(mod_action['guild_id'], "mod_action", mod_action)
+    stats_rollup.record(mod_action['guild_id'], 'mod_actions')
+
+# Pagination
+def encode_documents(documents: List[Dict[str, Any]]):
+    # Upserted documents carry native ObjectIds, which jsonable_encoder can't handle on its own
+    return jsonable_encoder(documents, custom_encoder={ObjectId: str})
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    """Serializes Mongo documents directly, without a jsonable_encoder pass.
+
+    Uses orjson when it is installed (datetimes are handled natively) and the
+    json module otherwise; ObjectIds become strings either way.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+_FIELD_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+
+def parse_fields(fields: Optional[str], sort: List[tuple]) -> Optional[Dict[str, bool]]:
+    """Mongo projection for a comma-separated ``fields`` parameter (sort keys are kept for cursors)"""
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    if not names or not all(_FIELD_NAME_RE.match(name) for name in names):
+        raise HTTPException(status_code=400, detail="fields must be a comma-separated list of field names")
+    projection = dict.fromkeys(names, True)
+    projection.update((field, True) for field, _ in sort)
+    return projection
+
+def encode_cursor(document: Dict[str, Any], sort: List[tuple]) -> str:
+    """Opaque token holding the sort key values of the last document on a page"""
+    payload = json_util.dumps([document.get(field) for field, _ in sort])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token: str, sort: List[tuple]) -> List[Any]:
+    values = json_util.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError("cursor does not match this listing")
+    return values
+
+def _after(field: str, direction: int, value: Any) -> Dict[str, Any]:
+    op = "$gt" if direction == ASCENDING else "$lt"
+    condition = {field: {op: value}}
+    # Legacy string _ids and native ObjectIds sort as separate BSON types (strings first)
+    if field == "_id" and direction == ASCENDING and isinstance(value, str):
+        return {"$or": [condition, {"_id": {"$type": "objectId"}}]}
+    if field == "_id" and direction == DESCENDING and isinstance(value, ObjectId):
+        return {"$or": [condition, {"_id": {"$type": "string"}}]}
+    return condition
+
+def keyset_filter(sort: List[tuple], values: List[Any]) -> Dict[str, Any]:
+    """Match documents strictly after ``values`` in ``sort`` order"""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {prev_field: values[j] for j, (prev_field, _) in enumerate(sort[:i])}
+        branches.append({"$and": [branch, _after(field, direction, values[i])]} if branch else _after(field, direction, values[i]))
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+async def paginate(collection, query: Dict[str, Any], sort: List[tuple], skip: int, limit: int, cursor: Optional[str],
+                   projection: Optional[Dict[str, bool]] = None, encode: bool = True):
+    """Page through a collection.
+
+    Without ``cursor`` this keeps the legacy skip/limit list response. With
+    ``cursor`` (empty for the first page) it seeks past the previous page
+    using the sort keys and returns ``{"items", "next_cursor"}``, so deep
+    pages cost the same as the first one. ``encode=False`` leaves documents
+    as read, for a FastJSONResponse.
+    """
+    encoded = encode_documents if encode else list
+    if cursor is None:
+        documents = await collection.find(query, projection).sort(sort).skip(skip).limit(limit).to_list(length=limit)
+        return encoded(documents)
+
+    if cursor:
+        try:
+            values = decode_cursor(cursor, sort)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = {"$and": [query, keyset_filter(sort, values)]}
+
+    documents = await collection.find(query, projection).sort(sort).limit(limit).to_list(length=limit)
+    next_cursor = encode_cursor(documents[-1], sort) if documents and len(documents) == limit else None
+    return {"items": encoded(documents), "next_cursor": next_cursor}
+
+# Profiling
+class LoopLagMonitor:
+    """Measures how late a periodic callback runs on one event loop.
+
+    The lag only becomes known once the loop is free again, so a watchdog
+    thread also checks each loop's last heartbeat and logs the stack of a
+    loop that is blocked at that moment.
+    """
+
+    def __init__(self, name: str, interval: float = LOOP_LAG_INTERVAL, threshold: float = SLOW_HANDLER_THRESHOLD):
+        self.name = name
+        self.interval = interval
+        self.threshold = threshold
+        self.thread_id = None
+        self._last_beat = None
+        self._reported = False
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self.thread_id = threading.get_ident()
+            self._last_beat = time.perf_counter()
+            self._task = asyncio.create_task(self._run())
+            loop_watchdog.watch(self)
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self._last_beat = now = time.perf_counter()
+            lag = max(now - expected, 0)
+            LOOP_LAG_SECONDS.observe(lag, loop=self.name)
+            if lag > self.threshold and not self._reported:
+                logger.warning("%s event loop lagged %.3fs", self.name, lag)
+            self._reported = False
+
+    def check(self):
+        """Called from the watchdog thread"""
+        if self._last_beat is None or self._reported or self._task.done():
+            return
+        stalled = time.perf_counter() - self._last_beat - self.interval
+        if stalled > self.threshold:
+            self._reported = True
+            frame = sys._current_frames().get(self.thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            logger.warning("%s event loop blocked for %.3fs so far:\n%s", self.name, stalled, stack)
+
+class LoopWatchdog:
+    def __init__(self):
+        self._monitors: List[LoopLagMonitor] = []
+        self._thread = None
+
+    def watch(self, monitor: LoopLagMonitor):
+        if monitor not in self._monitors:
+            self._monitors.append(monitor)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(LOOP_LAG_INTERVAL / 2)
+            for monitor in list(self._monitors):
+                monitor.check()
+
+loop_watchdog = LoopWatchdog()
+api_loop_monitor = LoopLagMonitor("api")
+bot_loop_monitor = LoopLagMonitor("bot")
+
+class HandlerProfiler:
+    """Logs event handlers and commands that run longer than ``threshold``.
+
+    When a handler is still running at the threshold, the stack of its task
+    is sampled so the log shows where it was waiting.
+    """
+
+    def __init__(self, threshold: float = SLOW_HANDLER_THRESHOLD):
+        self.threshold = threshold
+
+    def begin(self, name: str) -> Dict[str, Any]:
+        token = {"name": name, "start": time.perf_counter(), "stack": None}
+        task = asyncio.current_task()
+        if task:
+            token["timer"] = asyncio.get_running_loop().call_later(self.threshold, self._sample, token, task)
+        return token
+
+    def _sample(self, token: Dict[str, Any], task: asyncio.Task):
+        # Follow the await chain; Task.get_stack() stops at the task's own coroutine
+        frames = []
+        coro = task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+            if frame is None:
+                break
+            frames.append((frame, frame.f_lineno))
+            coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+        token["stack"] = ''.join(traceback.StackSummary.extract(frames).format())
+
+    def end(self, token: Optional[Dict[str, Any]]):
+        if token is None:
+            return
+        if token.get("timer"):
+            token["timer"].cancel()
+        elapsed = time.perf_counter() - token["start"]
+        if elapsed > self.threshold:
+            SLOW_HANDLERS.inc(handler=token["name"])
+            logger.warning("Slow handler %s took %.3fs\n%s", token["name"], elapsed, token["stack"] or "(blocked the loop before a stack could be sampled)")
+
+handler_profiler = HandlerProfiler()
+
+def profiled_handler(func):
+    """Report the event handler to handler_profiler when profiling is enabled"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not PROFILING_ENABLED:
+            return await func(*args, **kwargs)
+        token = handler_profiler.begin(func.__name__)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            handler_profiler.end(token)
+    return wrapper
+
+@bot.before_invoke
+async def profile_command_start(ctx):
+    if PROFILING_ENABLED:
+        ctx.profile_token = handler_profiler.begin(f"command:{ctx.command.qualified_name}")
+
+@bot.after_invoke
+async def profile_command_end(ctx):
+    handler_profiler.end(getattr(ctx, 'profile_token', None))
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_profile(duration: float, interval: float = 0.005) -> Counter:
+    """Sample every thread's stack for ``duration`` seconds; returns folded stacks and sample counts.
+
+    Blocks the calling thread, so run it in a worker thread.
+    """
+    own_thread = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    folded = Counter()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            folded[';'.join([names.get(thread_id, str(thread_id))] + stack[::-1])] += 1
+        time.sleep(interval)
+    return folded
+
+def write_profile(duration: float) -> Dict[str, Any]:
+    """Sample a profile and write it to PROFILE_DIR in the folded format flame graph tools read"""
+    folded = sample_profile(duration)
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"profile-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}.folded"
+    with open(path, 'w') as f:
+        for stack, count in folded.most_common():
+            f.write(f"{stack} {count}\n")
+    return {"path": str(path), "samples": sum(folded.values()), "stacks": len(folded)}
+
 # Bot Event Handlers
+async def init_guild_settings(database, guild_ids: List[str]) -> int:
+    """Create missing default settings in bulk and prime the settings cache; returns how many were created"""
+    settings = {doc['guild_id']: doc async for doc in database.bot_settings.find({"guild_id": {"$in": guild_ids}})}
+    missing = [BotSettings(guild_id=guild_id).dict(by_alias=True) for guild_id in guild_ids if guild_id not in settings]
+    created = len(missing)
+    if missing:
+        try:
+            await database.bot_settings.insert_many(missing, ordered=False)
+        except BulkWriteError as e:
+            # Settings created concurrently (e.g. through the API) win; load those instead
+            duplicates = {missing[error['index']]['guild_id'] for error in e.details.get('writeErrors', [])}
+            created -= len(duplicates)
+            missing = [doc for doc in missing if doc['guild_id'] not in duplicates]
+            async for doc in database.bot_settings.find({"guild_id": {"$in": list(duplicates)}}):
+                settings[doc['guild_id']] = doc
+        settings.update((doc['guild_id'], doc) for doc in missing)
+    
+    for guild_id, doc in settings.items():
+        settings_cache.set(guild_id, doc)
+    return created
+
 @bot.event
 async def on_ready():
     print(f'🤖 {bot.user} (المنظِّم الذكي) متصل بديسكورد!')
     print(f'Connected to {len(bot.guilds)} servers')
     
     # Start background tasks
-    check_quiet_hours.start()
-    weekly_report.start()
-    update_member_activity.start()
+    if PROFILING_ENABLED and BOT_RUN_MODE != 'loop':
+        bot_loop_monitor.start()
+    activity_buffer.start()
+    stats_rollup.start()
+    role_promoter.start()
+    quiet_hours_scheduler.start()
+    # on_ready fires again after a full reconnect; starting a running tasks.loop raises
+    if not weekly_report.is_running():
+        weekly_report.start()
+    if not update_member_activity.is_running():
+        update_member_activity.start()
     
-    # Initialize settings for all guilds
-    for guild in bot.guilds:
-        existing_settings = await db.bot_settings.find_one({"guild_id": str(guild.id)})
-        if not existing_settings:
-            settings = BotSettings(guild_id=str(guild.id))
-            await db.bot_settings.insert_one(settings.dict(by_alias=True))
+    if BOT_RUN_MODE == 'process' and not publish_bot_status.is_running():
+        publish_bot_status.start()
+    if BOT_RUN_MODE == 'process' and not SETTINGS_CHANGE_STREAM and not poll_settings_changes.is_running():
+        poll_settings_changes.start()
+    
+    # Strike counts are read once writes journaled by a previous run have been replayed
+    try:
+        await persistence_writer.flush()
+        await strike_counts.load(db, [str(guild.id) for guild in bot.guilds])
+    finally:
+        persistence_writer.start()
+    
+    # Initialize settings for all guilds and prime the settings cache
+    started = time.perf_counter()
+    created = await init_guild_settings(db, [str(guild.id) for guild in bot.guilds])
+    print(f"Loaded settings for {len(bot.guilds)} guilds ({created} created) in {(time.perf_counter() - started) * 1000:.0f}ms")
+    
+    global settings_watch_task
+    if SETTINGS_CHANGE_STREAM and (settings_watch_task is None or settings_watch_task.done()):
+        settings_watch_task = asyncio.create_task(watch_settings_changes())
 
 @bot.event
+@profiled_handler
 async def on_member_join(member):
     guild_id = str(member.guild.id)
-    settings = await db.bot_settings.find_one({"guild_id": guild_id})
+    settings = await settings_cache.get(guild_id)
     
     if not settings:
         return
     
-    # Save member to database
-    member_data = Member(
-        user_id=str(member.id),
-        username=str(member),
-        guild_id=guild_id,
-        join_date=datetime.utcnow()
+    # Save member to database (members are unique per guild, so rejoins update the record)
+    now = datetime.utcnow()
+    await db.members.update_one(
+        {"user_id": str(member.id), "guild_id": guild_id},
+        {
+            "$set": {"username": str(member), "join_date": now},
+            "$setOnInsert": {"strike_count": 0, "total_messages": 0, "last_active": now}
+        },
+        upsert=True
     )
-    await db.members.insert_one(member_data.dict(by_alias=True))
+    stats_rollup.record(guild_id, 'joins')
     
     # Send welcome message
     welcome_channel_id = settings.get('welcome_channel_id')
@@ -194,6 +1794,7 @@ async def on_member_join(member):
                 print(f"Cannot assign role to {member}")
 
 @bot.event
+@profiled_handler
 async def on_message(message):
     if message.author.bot:
         return
@@ -202,44 +1803,29 @@ async def on_message(message):
     if not guild_id:
         return
     
-    # Update member activity
-    await db.members.update_one(
-        {"user_id": str(message.author.id), "guild_id": guild_id},
-        {
-            "$inc": {"total_messages": 1},
-            "$set": {"last_active": datetime.utcnow()}
-        },
-        upsert=True
-    )
+    # Update member activity and daily stats (flushed in bulk in the background)
+    with ON_MESSAGE_SECONDS.time(phase="activity"):
+        activity_buffer.record(guild_id, str(message.author.id))
+        stats_rollup.record_message(guild_id, str(message.author.id))
     
     # Auto moderation
-    settings = await db.bot_settings.find_one({"guild_id": guild_id})
-    if settings and settings.get('forbidden_words'):
-        content_lower = message.content.lower()
-        if any(word in content_lower for word in settings['forbidden_words']):
-            await message.delete()
-            
-            # Add strike
-            strike = Strike(
-                user_id=str(message.author.id),
-                guild_id=guild_id,
-                reason="Inappropriate language",
-                moderator_id=str(bot.user.id)
-            )
-            await db.strikes.insert_one(strike.dict(by_alias=True))
-            
-            # Update member strike count
-            member_doc = await db.members.find_one({
-                "user_id": str(message.author.id),
-                "guild_id": guild_id
-            })
-            
-            if member_doc:
-                new_strike_count = member_doc.get('strike_count', 0) + 1
-                await db.members.update_one(
-                    {"user_id": str(message.author.id), "guild_id": guild_id},
-                    {"$set": {"strike_count": new_strike_count}}
+    with ON_MESSAGE_SECONDS.time(phase="settings"):
+        settings = await settings_cache.get(guild_id)
+    with ON_MESSAGE_SECONDS.time(phase="moderation"):
+        if settings and settings.get('forbidden_words'):
+            matcher = get_forbidden_matcher(guild_id, settings['forbidden_words'])
+            if matcher.match(message.content):
+                await message.delete()
+                
+                # Punishment is decided from in-memory counts; persistence_writer stores the strike
+                await strike_counts.load(db, [guild_id])
+                new_strike_count = record_strike(
+                    user_id=str(message.author.id),
+                    guild_id=guild_id,
+                    reason="Inappropriate language",
+                    moderator_id=str(bot.user.id)
                 )
+                stats_rollup.record(guild_id, 'strikes')
                 
                 # Progressive punishment
                 strike_limit = settings.get('strike_limit', 3)
@@ -252,7 +1838,7 @@ async def on_message(message):
                         )
                         
                         # Log moderation action
-                        mod_action = ModAction(
+                        mod_action = mod_action_document(
                             action="timeout",
                             target_id=str(message.author.id),
                             moderator_id=str(bot.user.id),
@@ -260,8 +1846,8 @@ async def on_message(message):
                             duration=60,
                             guild_id=guild_id
                         )
-                        await db.mod_actions.insert_one(mod_action.dict(by_alias=True))
-                        
+                        log_mod_action(mod_action)
+                    
                     except discord.Forbidden:
                         print(f"Cannot timeout {message.author}")
                 else:
@@ -270,7 +1856,8 @@ async def on_message(message):
                         f"Strike ({new_strike_count}/{strike_limit})"
                     )
     
-    await bot.process_commands(message)
+    with ON_MESSAGE_SECONDS.time(phase="commands"):
+        await bot.process_commands(message)
 
 # Bot Commands
 @bot.command(name='طرد', aliases=['kick'])
@@ -290,14 +1877,14 @@ async def kick_member(ctx, member: discord.Member, *, reason="لا يوجد سب
         await ctx.send(embed=embed)
         
         # Log action
-        mod_action = ModAction(
+        mod_action = mod_action_document(
             action="kick",
             target_id=str(member.id),
             moderator_id=str(ctx.author.id),
             reason=reason,
             guild_id=str(ctx.guild.id)
         )
-        await db.mod_actions.insert_one(mod_action.dict(by_alias=True))
+        log_mod_action(mod_action)
         
     except discord.Forbidden:
         await ctx.send("❌ ليس لدي صلاحية لطرد هذا العضو / I don't have permission to kick this member")
@@ -319,7 +1906,7 @@ async def mute_member(ctx, member: discord.Member, duration: int = 60, *, reason
         await ctx.send(embed=embed)
         
         # Log action
-        mod_action = ModAction(
+        mod_action = mod_action_document(
             action="timeout",
             target_id=str(member.id),
             moderator_id=str(ctx.author.id),
@@ -327,7 +1914,7 @@ async def mute_member(ctx, member: discord.Member, duration: int = 60, *, reason
             duration=duration,
             guild_id=str(ctx.guild.id)
         )
-        await db.mod_actions.insert_one(mod_action.dict(by_alias=True))
+        log_mod_action(mod_action)
         
     except discord.Forbidden:
         await ctx.send("❌ ليس لدي صلاحية لكتم هذا العضو / I don't have permission to mute this member")
@@ -344,14 +1931,14 @@ async def purge_messages(ctx, amount: int):
         await ctx.send(f"✅ تم حذف {len(deleted) - 1} رسالة / Deleted {len(deleted) - 1} messages", delete_after=5)
         
         # Log action
-        mod_action = ModAction(
+        mod_action = mod_action_document(
             action="purge",
             target_id=str(ctx.channel.id),
             moderator_id=str(ctx.author.id),
             reason=f"Purged {len(deleted) - 1} messages",
             guild_id=str(ctx.guild.id)
         )
-        await db.mod_actions.insert_one(mod_action.dict(by_alias=True))
+        log_mod_action(mod_action)
         
     except discord.Forbidden:
         await ctx.send("❌ ليس لدي صلاحية لحذف الرسائل / I don't have permission to delete messages")
@@ -374,21 +1961,7 @@ async def server_stats(ctx):
     # Get statistics
     total_members = len(ctx.guild.members)
     
-    # Get new members in last 7 days
-    week_ago = datetime.utcnow() - timedelta(days=7)
-    new_members = await db.members.count_documents({
-        "guild_id": guild_id,
-        "join_date": {"$gte": week_ago}
-    })
-    
-    # Get total strikes
-    total_strikes = await db.strikes.count_documents({"guild_id": guild_id})
-    
-    # Get mod actions this week
-    mod_actions = await db.mod_actions.count_documents({
-        "guild_id": guild_id,
-        "timestamp": {"$gte": week_ago}
-    })
+    stats = await stats_engine.get(guild_id)
     
     embed = discord.Embed(
         title="📊 إحصائيات الخادم / Server Statistics",
@@ -397,9 +1970,9 @@ async def server_stats(ctx):
     )
     
     embed.add_field(name="إجمالي الأعضاء / Total Members", value=total_members, inline=True)
-    embed.add_field(name="أعضاء جدد (7 أيام) / New Members (7d)", value=new_members, inline=True)
-    embed.add_field(name="إجمالي الإنذارات / Total Strikes", value=total_strikes, inline=True)
-    embed.add_field(name="إجراءات الإشراف (7 أيام) / Mod Actions (7d)", value=mod_actions, inline=True)
+    embed.add_field(name="أعضاء جدد (7 أيام) / New Members (7d)", value=stats['new_members_week'], inline=True)
+    embed.add_field(name="إجمالي الإنذارات / Total Strikes", value=stats['total_strikes'], inline=True)
+    embed.add_field(name="إجراءات الإشراف (7 أيام) / Mod Actions (7d)", value=stats['mod_actions_week'], inline=True)
     
     await ctx.send(embed=embed)
 
@@ -441,61 +2014,223 @@ class RoleView(discord.ui.View):
             await interaction.response.send_message("❌ لا يمكنني تعديل أدوارك / Cannot modify your roles", ephemeral=True)
 
 # Background Tasks
-@tasks.loop(minutes=1)
-async def check_quiet_hours():
-    current_time = datetime.now().time()
+def _guild_timezone(settings: Dict[str, Any]):
+    try:
+        return ZoneInfo(settings.get('timezone') or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+def _next_local(local_now: datetime, at) -> datetime:
+    candidate = datetime.combine(local_now.date(), at, tzinfo=local_now.tzinfo)
+    if candidate <= local_now:
+        candidate = datetime.combine(local_now.date() + timedelta(days=1), at, tzinfo=local_now.tzinfo)
+    return candidate
+
+def quiet_hours_state(settings: Dict[str, Any], now: datetime) -> tuple:
+    """Return (is_quiet, next_transition) for a guild; both times are naive UTC"""
+    local_now = now.replace(tzinfo=timezone.utc).astimezone(_guild_timezone(settings))
+    quiet_start = datetime.strptime(settings.get('quiet_start', '22:00'), "%H:%M").time()
+    quiet_end = datetime.strptime(settings.get('quiet_end', '08:00'), "%H:%M").time()
     
-    for guild in bot.guilds:
-        guild_id = str(guild.id)
-        settings = await db.bot_settings.find_one({"guild_id": guild_id})
-        
-        if not settings or not settings.get('quiet_hours_enabled', True):
-            continue
-        
-        quiet_start = datetime.strptime(settings.get('quiet_start', '22:00'), "%H:%M").time()
-        quiet_end = datetime.strptime(settings.get('quiet_end', '08:00'), "%H:%M").time()
+    current_time = local_now.time().replace(tzinfo=None)
+    if quiet_start <= quiet_end:
+        is_quiet_time = quiet_start <= current_time < quiet_end
+    else:
+        # Window wraps past midnight, e.g. 22:00-08:00
+        is_quiet_time = current_time >= quiet_start or current_time < quiet_end
+    
+    next_transition = min(_next_local(local_now, quiet_start), _next_local(local_now, quiet_end))
+    return is_quiet_time, next_transition.astimezone(timezone.utc).replace(tzinfo=None)
+
+async def apply_quiet_hours(guild, is_quiet_time: bool):
+    """Lock or unlock the guild's general channel to match the quiet-hours state"""
+    # Get general channel
+    general_channel = discord.utils.get(guild.text_channels, name="general")
+    if not general_channel and guild.text_channels:
+        general_channel = guild.text_channels[0]
+    
+    if general_channel:
+        overwrites = general_channel.overwrites_for(guild.default_role)
         
-        is_quiet_time = current_time >= quiet_start or current_time <= quiet_end
+        if is_quiet_time and overwrites.send_messages is not False:
+            overwrites.send_messages = False
+            await general_channel.set_permissions(guild.default_role, overwrite=overwrites)
+            
+            embed = discord.Embed(
+                title="🌙 ساعات الهدوء / Quiet Hours",
+                description="تم تفعيل ساعات الهدوء\nQuiet hours are now active",
+                color=0x000080
+            )
+            await general_channel.send(embed=embed)
+            
+        elif not is_quiet_time and overwrites.send_messages is False:
+            overwrites.send_messages = None
+            await general_channel.set_permissions(guild.default_role, overwrite=overwrites)
+            
+            embed = discord.Embed(
+                title="☀️ انتهاء ساعات الهدوء / Quiet Hours Ended",
+                description="انتهت ساعات الهدوء، يمكنكم التحدث الآن\nQuiet hours have ended, you can chat now",
+                color=0xffff00
+            )
+            await general_channel.send(embed=embed)
+
+class QuietHoursScheduler:
+    """Wakes only when some guild's quiet hours start or end.
+
+    Each guild's next transition sits on a heap of deadlines. A guild is
+    re-evaluated when its deadline passes, when its settings change (via the
+    settings cache listener, safe to call from the API thread), and on an
+    hourly resync that catches changes made by other processes.
+    """
+
+    RESYNC_INTERVAL = 3600
+    RETRY_DELAY = 60
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._generations: Dict[str, int] = {}
+        self._dirty: set = set()
+        self._resync_all = True
+        self._last_resync = 0.0
+        self._loop = None
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self.reschedule()
+
+    def reschedule(self, guild_id: Optional[str] = None):
+        if guild_id is None:
+            self._resync_all = True
+        else:
+            self._dirty.add(guild_id)
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            if self._resync_all or time.monotonic() - self._last_resync > self.RESYNC_INTERVAL:
+                self._resync_all = False
+                self._last_resync = time.monotonic()
+                self._dirty.update(str(guild.id) for guild in bot.guilds)
+            
+            with TASK_SECONDS.time(task="quiet_hours"):
+                dirty, self._dirty = self._dirty, set()
+                for guild_id in dirty:
+                    await self._evaluate(guild_id)
+                
+                now = datetime.utcnow()
+                while self._heap and self._heap[0][0] <= now:
+                    _, guild_id, generation = heapq.heappop(self._heap)
+                    if generation == self._generations.get(guild_id):
+                        await self._evaluate(guild_id)
+            
+            timeout = self.RESYNC_INTERVAL
+            if self._heap:
+                timeout = min(timeout, max((self._heap[0][0] - datetime.utcnow()).total_seconds(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _evaluate(self, guild_id: str):
+        """Apply the guild's current state and schedule its next transition"""
+        # A new generation makes any deadline already on the heap stale
+        generation = self._generations.get(guild_id, 0) + 1
+        self._generations[guild_id] = generation
         
-        # Get general channel
-        general_channel = discord.utils.get(guild.text_channels, name="general")
-        if not general_channel and guild.text_channels:
-            general_channel = guild.text_channels[0]
+        guild = bot.get_guild(int(guild_id))
+        try:
+            settings = await settings_cache.get(guild_id)
+            if not guild or not settings or not settings.get('quiet_hours_enabled', True):
+                return
+            
+            is_quiet_time, next_transition = quiet_hours_state(settings, datetime.utcnow())
+            await apply_quiet_hours(guild, is_quiet_time)
+        except Exception as e:
+            print(f"Quiet hours failed for guild {guild_id}: {e}")
+            next_transition = datetime.utcnow() + timedelta(seconds=self.RETRY_DELAY)
         
-        if general_channel:
-            overwrites = general_channel.overwrites_for(guild.default_role)
+        heapq.heappush(self._heap, (next_transition, guild_id, generation))
+
+quiet_hours_scheduler = QuietHoursScheduler()
+settings_cache.add_listener(quiet_hours_scheduler.reschedule)
+
+# Guilds whose weekly report is scheduled or being sent, and the tasks sending them
+_weekly_reports_in_flight: set = set()
+_weekly_report_tasks: set = set()
+
+def cancel_weekly_reports():
+    """Cancel scheduled report sends; unsent guilds are picked up again after a restart"""
+    for task in _weekly_report_tasks:
+        task.cancel()
+
+def report_offset(guild_id: str) -> int:
+    """Stable per-guild delay (seconds) that spreads report sends across the hour"""
+    return zlib.crc32(guild_id.encode()) % 3600
+
+async def send_weekly_report(guild, log_channel, totals: Dict[str, int], delay: int, semaphore: asyncio.Semaphore):
+    guild_id = str(guild.id)
+    try:
+        await asyncio.sleep(delay)
+        async with semaphore, TASK_SECONDS.time(task="weekly_report_send"):
+            end_date = datetime.utcnow()
+            start_date = end_date - timedelta(days=7)
             
-            if is_quiet_time and overwrites.send_messages is not False:
-                overwrites.send_messages = False
-                await general_channel.set_permissions(guild.default_role, overwrite=overwrites)
-                
-                embed = discord.Embed(
-                    title="🌙 ساعات الهدوء / Quiet Hours",
-                    description="تم تفعيل ساعات الهدوء\nQuiet hours are now active",
-                    color=0x000080
-                )
-                await general_channel.send(embed=embed)
-                
-            elif not is_quiet_time and overwrites.send_messages is False:
-                overwrites.send_messages = None
-                await general_channel.set_permissions(guild.default_role, overwrite=overwrites)
-                
-                embed = discord.Embed(
-                    title="☀️ انتهاء ساعات الهدوء / Quiet Hours Ended",
-                    description="انتهت ساعات الهدوء، يمكنكم التحدث الآن\nQuiet hours have ended, you can chat now",
-                    color=0xffff00
-                )
-                await general_channel.send(embed=embed)
+            # Create report embed
+            embed = discord.Embed(
+                title="📊 التقرير الأسبوعي / Weekly Report",
+                description=f"تقرير من {start_date.strftime('%Y-%m-%d')} إلى {end_date.strftime('%Y-%m-%d')}\nReport from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}",
+                color=0x00ff00,
+                timestamp=datetime.utcnow()
+            )
+            
+            embed.add_field(name="أعضاء جدد / New Members", value=totals.get('joins', 0), inline=True)
+            embed.add_field(name="إجمالي الإنذارات / Total Strikes", value=totals.get('strikes', 0), inline=True)
+            embed.add_field(name="إجراءات الإشراف / Mod Actions", value=totals.get('mod_actions', 0), inline=True)
+            embed.add_field(name="إجمالي الأعضاء / Total Members", value=len(guild.members), inline=True)
+            
+            await log_channel.send(embed=embed)
+            await db.weekly_reports.update_one(
+                {"guild_id": guild_id},
+                {"$set": {"last_sent": datetime.utcnow()}},
+                upsert=True
+            )
+    except Exception as e:
+        print(f"Failed to send weekly report for guild {guild_id}: {e}")
+    finally:
+        _weekly_reports_in_flight.discard(guild_id)
 
-@tasks.loop(hours=168)  # Weekly
+@tasks.loop(hours=1)
+@timed_task("weekly_report")
 async def weekly_report():
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=7)
+    """Schedule reports for guilds whose last report is at least a week old.
+
+    The last-sent time is persisted per guild, so restarts neither skip nor
+    repeat reports. Figures for every due guild come from one aggregation,
+    and sends are staggered across the hour with bounded concurrency.
+    """
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    guild_ids = [str(guild.id) for guild in bot.guilds]
+    last_sent = {
+        doc['guild_id']: doc.get('last_sent')
+        async for doc in db.weekly_reports.find({"guild_id": {"$in": guild_ids}})
+    }
     
+    due = []
     for guild in bot.guilds:
         guild_id = str(guild.id)
-        settings = await db.bot_settings.find_one({"guild_id": guild_id})
+        if guild_id in _weekly_reports_in_flight:
+            continue
+        if last_sent.get(guild_id) and last_sent[guild_id] > week_ago:
+            continue
         
+        settings = await settings_cache.get(guild_id)
         if not settings or not settings.get('log_channel_id'):
             continue
         
@@ -503,75 +2238,289 @@ async def weekly_report():
         if not log_channel:
             continue
         
-        # Gather statistics
-        new_members = await db.members.count_documents({
-            'guild_id': guild_id,
-            'join_date': {'$gte': start_date, '$lte': end_date}
-        })
-        
-        total_strikes = await db.strikes.count_documents({
-            'guild_id': guild_id,
-            'timestamp': {'$gte': start_date, '$lte': end_date}
-        })
+        due.append((guild, log_channel))
+    
+    if not due:
+        return
+    
+    # Gather statistics
+    totals = await stats_engine.weekly_totals([str(guild.id) for guild, _ in due])
+    semaphore = asyncio.Semaphore(WEEKLY_REPORT_CONCURRENCY)
+    for guild, log_channel in due:
+        guild_id = str(guild.id)
+        _weekly_reports_in_flight.add(guild_id)
+        # Sends wait up to an hour; hold a reference so the task isn't garbage collected meanwhile
+        task = asyncio.create_task(send_weekly_report(guild, log_channel, totals.get(guild_id, {}), report_offset(guild_id), semaphore))
+        _weekly_report_tasks.add(task)
+        task.add_done_callback(_weekly_report_tasks.discard)
+
+# Activity roles
+ACTIVE_ROLE_NAME = "Active Member"
+_active_role_locks: Dict[int, asyncio.Lock] = {}
+
+async def ensure_active_role(guild):
+    """Return the guild's "Active Member" role, creating it once if it's missing"""
+    lock = _active_role_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
+        active_role = discord.utils.get(guild.roles, name=ACTIVE_ROLE_NAME)
+        if not active_role:
+            try:
+                active_role = await guild.create_role(
+                    name=ACTIVE_ROLE_NAME,
+                    color=discord.Color.green(),
+                    mentionable=True
+                )
+            except discord.Forbidden:
+                return None
+        return active_role
+
+class RolePromoter:
+    """Grants the "Active Member" role through a bounded pool of workers.
+
+    Promotions are queued and drained by ``workers`` tasks, so a large scan
+    never has more than that many role requests in flight; discord.py queues
+    them on the route's rate-limit bucket, and a 429 that still surfaces
+    pauses the worker for ``retry_after``. The queue is bounded, so
+    producers slow down instead of buffering a whole guild. Members are
+    marked ``active_role_granted`` once they hold the role so later scans
+    skip them.
+    """
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self, collection, workers: int = 4, max_queue: int = 1000):
+        self.collection = collection
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queue = None
+        self._queued: set = set()
+        self._tasks = []
+        self.granted = 0
+        self.rate_limited = 0
+
+    def start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def enqueue(self, guild_id: str, user_id: str):
+        if (guild_id, user_id) in self._queued:
+            return
+        self._queued.add((guild_id, user_id))
+        await self._queue.put((guild_id, user_id))
+
+    def try_enqueue(self, guild_id: str, user_id: str) -> bool:
+        """Queue a promotion unless the queue is full; returns whether the member is queued"""
+        if (guild_id, user_id) in self._queued:
+            return True
+        if self._queue is None:
+            return False
+        try:
+            self._queue.put_nowait((guild_id, user_id))
+        except asyncio.QueueFull:
+            return False
+        self._queued.add((guild_id, user_id))
+        return True
+
+    async def mark_granted(self, guild_id: str, user_ids: List[str]):
+        if user_ids:
+            await self.collection.update_many(
+                {"guild_id": guild_id, "user_id": {"$in": user_ids}},
+                {"$set": {"active_role_granted": True}}
+            )
+
+    async def _worker(self):
+        while True:
+            guild_id, user_id = await self._queue.get()
+            try:
+                await self._promote(guild_id, user_id)
+            except (discord.Forbidden, discord.NotFound):
+                pass
+            except Exception as e:
+                print(f"Failed to grant {ACTIVE_ROLE_NAME} to {user_id} in {guild_id}: {e}")
+            finally:
+                self._queued.discard((guild_id, user_id))
+                self._queue.task_done()
+
+    async def _promote(self, guild_id: str, user_id: str):
+        guild = bot.get_guild(int(guild_id))
+        member = guild.get_member(int(user_id)) if guild else None
+        if not member:
+            return
         
-        mod_actions = await db.mod_actions.count_documents({
-            'guild_id': guild_id,
-            'timestamp': {'$gte': start_date, '$lte': end_date}
-        })
+        active_role = await ensure_active_role(guild)
+        if not active_role:
+            return
         
-        # Create report embed
-        embed = discord.Embed(
-            title="📊 التقرير الأسبوعي / Weekly Report",
-            description=f"تقرير من {start_date.strftime('%Y-%m-%d')} إلى {end_date.strftime('%Y-%m-%d')}\nReport from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}",
-            color=0x00ff00,
-            timestamp=datetime.utcnow()
-        )
+        if active_role not in member.roles:
+            for attempt in range(self.MAX_ATTEMPTS):
+                try:
+                    await member.add_roles(active_role, reason="Active member")
+                    break
+                except discord.HTTPException as e:
+                    if e.status != 429 or attempt == self.MAX_ATTEMPTS - 1:
+                        raise
+                    self.rate_limited += 1
+                    await asyncio.sleep(getattr(e, 'retry_after', None) or 2 ** attempt)
+            self.granted += 1
         
-        embed.add_field(name="أعضاء جدد / New Members", value=new_members, inline=True)
-        embed.add_field(name="إجمالي الإنذارات / Total Strikes", value=total_strikes, inline=True)
-        embed.add_field(name="إجراءات الإشراف / Mod Actions", value=mod_actions, inline=True)
-        embed.add_field(name="إجمالي الأعضاء / Total Members", value=len(guild.members), inline=True)
+        await self.mark_granted(guild_id, [user_id])
+
+role_promoter = RolePromoter(db.members, workers=ROLE_GRANT_WORKERS)
+
+def active_member_query(guild_id: str, week_ago: datetime) -> Dict[str, Any]:
+    """Members who joined over a week ago, sent 10+ messages, have <3 strikes and aren't promoted yet"""
+    return {
+        "guild_id": guild_id,
+        "join_date": {"$lte": week_ago},
+        "total_messages": {"$gte": 10},
+        "strike_count": {"$lt": 3},
+        "active_role_granted": {"$ne": True}
+    }
+
+async def promote_active_members(keys: List[tuple]):
+    """Queue promotions for members whose just-flushed activity made them eligible.
+
+    This runs inside the activity flush loop, so it never waits for room in
+    the promotion queue: members skipped while the queue is full (e.g. behind
+    the startup sweep) are still eligible and are queued again the next time
+    their activity is flushed.
+    """
+    user_ids_by_guild: Dict[str, List[str]] = {}
+    for guild_id, user_id in keys:
+        user_ids_by_guild.setdefault(guild_id, []).append(user_id)
+    
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    for guild_id, user_ids in user_ids_by_guild.items():
+        settings = await settings_cache.get(guild_id)
+        if not settings or not settings.get('auto_role_enabled', True):
+            continue
         
-        await log_channel.send(embed=embed)
+        query = active_member_query(guild_id, week_ago)
+        query["user_id"] = {"$in": user_ids}
+        async for member_doc in db.members.find(query, {"user_id": True, "_id": False}):
+            role_promoter.try_enqueue(guild_id, member_doc['user_id'])
 
-@tasks.loop(hours=1)
+activity_buffer.add_listener(promote_active_members)
+
+# Join-date cutoff covered by the previous sweep; None means sweep everything
+_last_sweep_cutoff = None
+
+@tasks.loop(hours=24)
+@timed_task("update_member_activity")
 async def update_member_activity():
-    """Update member activity and auto-assign roles based on activity"""
+    """Promote members who became eligible by aging past 7 days.
+
+    Members who cross the message threshold are promoted as their activity
+    is flushed (promote_active_members), so this sweep only has to look at
+    join dates that passed the 7-day mark since the previous run. The first
+    run after startup sweeps everything to catch up on downtime.
+    """
+    global _last_sweep_cutoff
+    role_promoter.start()
+    
+    week_ago = datetime.utcnow() - timedelta(days=7)
     for guild in bot.guilds:
         guild_id = str(guild.id)
-        settings = await db.bot_settings.find_one({"guild_id": guild_id})
+        settings = await settings_cache.get(guild_id)
         
         if not settings or not settings.get('auto_role_enabled', True):
             continue
         
-        # Get members who joined more than 7 days ago and have been active
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        active_members = await db.members.find({
-            "guild_id": guild_id,
-            "join_date": {"$lte": week_ago},
-            "total_messages": {"$gte": 10},
-            "strike_count": {"$lt": 3}
-        }).to_list(length=None)
-        
         # Auto-assign "Active Member" role
-        active_role = discord.utils.get(guild.roles, name="Active Member")
+        active_role = await ensure_active_role(guild)
         if not active_role:
-            try:
-                active_role = await guild.create_role(
-                    name="Active Member",
-                    color=discord.Color.green(),
-                    mentionable=True
-                )
-            except discord.Forbidden:
-                continue
+            continue
         
-        for member_doc in active_members:
-            try:
-                member = guild.get_member(int(member_doc['user_id']))
-                if member and active_role not in member.roles:
-                    await member.add_roles(active_role)
-            except (discord.Forbidden, discord.NotFound):
+        query = active_member_query(guild_id, week_ago)
+        if _last_sweep_cutoff:
+            query["join_date"]["$gt"] = _last_sweep_cutoff
+        cursor = db.members.find(query, {"user_id": True, "_id": False}).batch_size(500)
+        
+        already_granted = []
+        async for member_doc in cursor:
+            member = guild.get_member(int(member_doc['user_id']))
+            if not member:
                 continue
+            
+            if active_role in member.roles:
+                already_granted.append(member_doc['user_id'])
+                if len(already_granted) >= 500:
+                    await role_promoter.mark_granted(guild_id, already_granted)
+                    already_granted = []
+            else:
+                await role_promoter.enqueue(guild_id, member_doc['user_id'])
+        
+        await role_promoter.mark_granted(guild_id, already_granted)
+    
+    _last_sweep_cutoff = week_ago
+
+def guild_summary(guild) -> Dict[str, Any]:
+    return {
+        "id": str(guild.id),
+        "name": guild.name,
+        "member_count": len(guild.members),
+        "icon": str(guild.icon.url) if guild.icon else None,
+        "shard_id": guild.shard_id
+    }
+
+def latency_ms(latency: float) -> Optional[float]:
+    # Latency is nan/inf until the first heartbeat is acknowledged
+    return round(latency * 1000, 2) if math.isfinite(latency) else None
+
+def shard_summaries() -> List[Dict[str, Any]]:
+    """Per-shard latency and guild counts for the shards this process owns"""
+    if not isinstance(bot, commands.AutoShardedBot):
+        return [{"id": 0, "latency": latency_ms(bot.latency), "guilds": len(bot.guilds), "closed": bot.is_closed()}]
+    
+    guild_counts = Counter(guild.shard_id for guild in bot.guilds)
+    return [
+        {"id": shard_id, "latency": latency_ms(shard.latency), "guilds": guild_counts[shard_id], "closed": shard.is_closed()}
+        for shard_id, shard in sorted(bot.shards.items())
+    ]
+
+def record_gateway_latency():
+    for shard in shard_summaries():
+        if shard['latency'] is not None:
+            GATEWAY_LATENCY.set(shard['latency'] / 1000, shard=shard['id'])
+
+def bot_snapshot() -> Dict[str, Any]:
+    """State of this bot process as published for an API running in another process"""
+    ready = bot.is_ready()
+    if ready:
+        record_gateway_latency()
+    return {
+        "_id": BOT_INSTANCE_ID,
+        "ready": ready,
+        "guilds": [guild_summary(guild) for guild in bot.guilds] if ready else [],
+        "users": len(bot.users) if ready else 0,
+        "latency": latency_ms(bot.latency) if ready else None,
+        "shard_count": bot.shard_count,
+        "shards": shard_summaries() if ready else [],
+        "activity": activity_buffer.stats(),
+        "metrics": metrics.collect(),
+        "guild_versions": guild_versions.snapshot(),
+        "updated_at": datetime.utcnow()
+    }
+
+@tasks.loop(seconds=BOT_STATUS_INTERVAL)
+async def publish_bot_status():
+    # tasks.loop stops for good on an unhandled error; a Mongo blip must only skip one snapshot
+    try:
+        await db.bot_status.replace_one({"_id": BOT_INSTANCE_ID}, bot_snapshot(), upsert=True)
+    except PyMongoError as e:
+        print(f"Failed to publish bot status: {e}")
+
+async def flush_buffers(database):
+    """Write out pending write-behind counters and moderation writes through ``database``"""
+    # Moderation writes go first; they are journaled rather than lost if Mongo is down
+    for buffer, collection in ((persistence_writer, database), (activity_buffer, database.members), (stats_rollup, database.server_stats)):
+        try:
+            await buffer.flush(collection)
+        except Exception as e:
+            print(f"Failed to flush {buffer.name} counters: {e}")
 
 # Error handling
 @bot.event
@@ -591,33 +2540,90 @@ async def on_command_error(ctx, error):
         print(f"Bot error: {error}")
 
 # API Endpoints
+async def read_bot_snapshots() -> List[Dict[str, Any]]:
+    """Snapshots published recently enough by bot workers to be trusted"""
+    cutoff = datetime.utcnow() - timedelta(seconds=BOT_STATUS_INTERVAL * 3)
+    return await api_db.bot_status.find({"updated_at": {"$gte": cutoff}, "ready": True}).to_list(length=None)
+
+def average_latency(shards: List[Dict[str, Any]]) -> Optional[float]:
+    latencies = [shard['latency'] for shard in shards if shard['latency'] is not None]
+    return round(sum(latencies) / len(latencies), 2) if latencies else None
+
+@app.middleware("http")
+async def time_api_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    API_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code
+    )
+    return response
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition; bot workers' metrics come from their snapshots in process mode"""
+    sources = []
+    if BOT_RUN_MODE == 'process':
+        sources = [({"instance": snapshot['_id']}, snapshot.get('metrics', [])) for snapshot in await read_bot_snapshots()]
+    elif bot.is_ready():
+        record_gateway_latency()
+    return Response(render_metrics(({}, metrics.collect()), *sources), media_type="text/plain; version=0.0.4")
+
+@api_router.post("/admin/profile")
+async def dump_profile(seconds: float = 10, x_admin_token: Optional[str] = Header(None)):
+    """Sample every thread of this process for ``seconds`` and write the profile to PROFILE_DIR"""
+    if not PROFILING_ENABLED or not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode(), ADMIN_API_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    if not 0 < seconds <= 120:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 120")
+    
+    return await asyncio.to_thread(write_profile, seconds)
+
 @api_router.get("/bot/status")
 async def get_bot_status():
+    if BOT_RUN_MODE == 'process':
+        snapshots = await read_bot_snapshots()
+        if not snapshots:
+            return {"status": "connecting", "guilds": 0, "users": 0}
+        
+        shards = sorted((shard for snapshot in snapshots for shard in snapshot.get('shards', [])), key=lambda shard: shard['id'])
+        return {
+            "status": "online",
+            "guilds": sum(len(snapshot['guilds']) for snapshot in snapshots),
+            "users": sum(snapshot['users'] for snapshot in snapshots),
+            "latency": average_latency(shards),
+            "shard_count": max((snapshot.get('shard_count') or 1) for snapshot in snapshots),
+            "shards": shards
+        }
+    
     if not bot.is_ready():
         return {"status": "connecting", "guilds": 0, "users": 0}
     
+    shards = shard_summaries()
     return {
         "status": "online",
         "guilds": len(bot.guilds),
         "users": len(bot.users),
-        "latency": round(bot.latency * 1000, 2)
+        "latency": average_latency(shards),
+        "shard_count": bot.shard_count or 1,
+        "shards": shards,
+        "activity": activity_buffer.stats()
     }
 
 @api_router.get("/bot/guilds")
 async def get_bot_guilds():
+    if BOT_RUN_MODE == 'process':
+        return [guild for snapshot in await read_bot_snapshots() for guild in snapshot['guilds']]
+    
     if not bot.is_ready():
         return []
     
-    guilds = []
-    for guild in bot.guilds:
-        guilds.append({
-            "id": str(guild.id),
-            "name": guild.name,
-            "member_count": len(guild.members),
-            "icon": str(guild.icon.url) if guild.icon else None
-        })
-    
-    return guilds
+    return [guild_summary(guild) for guild in bot.guilds]
 
 @api_router.get("/bot/settings/{guild_id}")
 async def get_bot_settings(guild_id: str):
@@ -626,6 +2632,7 @@ async def get_bot_settings(guild_id: str):
         # Create default settings if none exist
         default_settings = BotSettings(guild_id=guild_id)
         await api_db.bot_settings.insert_one(default_settings.dict(by_alias=True))
+        settings_cache.invalidate(guild_id)
         return jsonable_encoder(default_settings.dict(by_alias=True))
     
     # Convert ObjectId to string
@@ -636,54 +2643,225 @@ async def get_bot_settings(guild_id: str):
 
 @api_router.put("/bot/settings/{guild_id}")
 async def update_bot_settings(guild_id: str, settings: Dict[str, Any]):
+    # updated_at comes from the server clock (never the client); bot workers poll it to refresh their cached copy
+    settings.pop('updated_at', None)
     result = await api_db.bot_settings.update_one(
         {"guild_id": guild_id},
-        {"$set": settings},
+        {"$set": settings, "$currentDate": {"updated_at": True}},
         upsert=True
     )
     
     if result.matched_count == 0 and result.upserted_id is None:
         raise HTTPException(status_code=404, detail="Failed to update settings")
     
+    settings_cache.invalidate(guild_id)
+    
     return {"message": "Settings updated successfully"}
 
 @api_router.get("/bot/stats/{guild_id}")
 async def get_guild_stats(guild_id: str):
-    week_ago = datetime.utcnow() - timedelta(days=7)
+    return await api_stats_engine.get(guild_id)
+
+@api_router.get("/bot/stats/{guild_id}/history")
+async def get_guild_stats_history(guild_id: str, start: Optional[str] = None, end: Optional[str] = None, days: int = 30):
+    """Daily ServerStats rollups between start and end (YYYY-MM-DD, UTC), defaulting to the last `days` days"""
+    try:
+        end_date = datetime.strptime(end, "%Y-%m-%d") if end else datetime.utcnow()
+        start_date = datetime.strptime(start, "%Y-%m-%d") if start else end_date - timedelta(days=max(days, 1) - 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be formatted as YYYY-MM-DD")
     
-    total_members = await api_db.members.count_documents({"guild_id": guild_id})
-    new_members = await api_db.members.count_documents({
-        "guild_id": guild_id,
-        "join_date": {"$gte": week_ago}
-    })
-    total_strikes = await api_db.strikes.count_documents({"guild_id": guild_id})
-    mod_actions = await api_db.mod_actions.count_documents({
-        "guild_id": guild_id,
-        "timestamp": {"$gte": week_ago}
-    })
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="History range is limited to 366 days")
     
-    return {
-        "total_members": total_members,
-        "new_members_week": new_members,
-        "total_strikes": total_strikes,
-        "mod_actions_week": mod_actions,
-        "timestamp": datetime.utcnow()
-    }
+    history = await api_stats_engine.history(guild_id, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d"))
+    return jsonable_encoder(history)
 
-@api_router.get("/bot/members/{guild_id}")
-async def get_guild_members(guild_id: str, skip: int = 0, limit: int = 50):
-    members = await api_db.members.find({"guild_id": guild_id}).skip(skip).limit(limit).to_list(length=limit)
-    return jsonable_encoder(members)
+# Sort keys for list endpoints; the last key must be unique so cursors are unambiguous.
+# Members end on _id too: user_id is only unique per guild if the unique index could be built
+MEMBERS_SORT = [("user_id", ASCENDING), ("_id", ASCENDING)]
+TIMELINE_SORT = [("timestamp", DESCENDING), ("_id", DESCENDING)]
 
-@api_router.get("/bot/strikes/{guild_id}")
-async def get_guild_strikes(guild_id: str, skip: int = 0, limit: int = 50):
-    strikes = await api_db.strikes.find({"guild_id": guild_id}).sort("timestamp", -1).skip(skip).limit(limit).to_list(length=limit)
-    return jsonable_encoder(strikes)
+# List endpoints take fields=a,b to project documents in Mongo; the sort keys and _id always come back
+@api_router.get("/bot/members/{guild_id}", response_class=FastJSONResponse)
+async def get_guild_members(guild_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, MEMBERS_SORT)
+    return FastJSONResponse(await paginate(api_db.members, {"guild_id": guild_id}, MEMBERS_SORT, skip, limit, cursor, projection, encode=False))
 
-@api_router.get("/bot/actions/{guild_id}")
-async def get_mod_actions(guild_id: str, skip: int = 0, limit: int = 50):
-    actions = await api_db.mod_actions.find({"guild_id": guild_id}).sort("timestamp", -1).skip(skip).limit(limit).to_list(length=limit)
-    return jsonable_encoder(actions)
+@api_router.get("/bot/strikes/{guild_id}", response_class=FastJSONResponse)
+async def get_guild_strikes(guild_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, TIMELINE_SORT)
+    return FastJSONResponse(await paginate(api_db.strikes, {"guild_id": guild_id}, TIMELINE_SORT, skip, limit, cursor, projection, encode=False))
+
+@api_router.get("/bot/actions/{guild_id}", response_class=FastJSONResponse)
+async def get_mod_actions(guild_id: str, skip: int = 0, limit: int = 50, cursor: Optional[str] = None, fields: Optional[str] = None):
+    projection = parse_fields(fields, TIMELINE_SORT)
+    return FastJSONResponse(await paginate(api_db.mod_actions, {"guild_id": guild_id}, TIMELINE_SORT, skip, limit, cursor, projection, encode=False))
+
+def dashboard_etag(guild_id: str, worker_versions: List[str], limit: int) -> str:
+    # The date is part of the tag because the weekly and daily stats roll over without any write
+    version = ':'.join([guild_versions.get(guild_id), *worker_versions, datetime.utcnow().strftime('%Y-%m-%d'), str(limit)])
+    return '"' + hashlib.sha1(f"{guild_id}:{version}".encode()).hexdigest() + '"'
+
+async def read_worker_versions(guild_id: str) -> List[str]:
+    """Change versions for ``guild_id`` from the bot workers' snapshots (BOT_RUN_MODE=process)"""
+    snapshots = await api_db.bot_status.find(
+        {}, {"guild_versions.boot_id": True, "guild_versions.epoch": True, f"guild_versions.versions.{guild_id}": True}
+    ).sort("_id", ASCENDING).to_list(length=None)
+    versions = []
+    for snapshot in snapshots:
+        worker = snapshot.get('guild_versions') or {}
+        versions.append(f"{worker.get('boot_id')}.{worker.get('epoch')}.{worker.get('versions', {}).get(guild_id, 0)}")
+    return versions
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in tags
+
+@api_router.get("/bot/dashboard/{guild_id}")
+async def get_guild_dashboard(guild_id: str, limit: int = 50, if_none_match: Optional[str] = Header(None)):
+    """Stats, settings, recent strikes and recent actions in one response.
+
+    The strong ETag is derived from the guild's change versions, so a refresh
+    with nothing new gets a 304 without running the dashboard queries.
+    """
+    # Versions are read before the data, so a change racing with this request gets a new tag next time
+    worker_versions = await read_worker_versions(guild_id) if BOT_RUN_MODE == 'process' else []
+    etag = dashboard_etag(guild_id, worker_versions, limit)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    stats, settings, strikes, actions = await asyncio.gather(
+        api_stats_engine.get(guild_id, version=etag),
+        get_bot_settings(guild_id),
+        paginate(api_db.strikes, {"guild_id": guild_id}, TIMELINE_SORT, 0, limit, None),
+        paginate(api_db.mod_actions, {"guild_id": guild_id}, TIMELINE_SORT, 0, limit, None)
+    )
+    body = {"stats": stats, "settings": settings, "strikes": strikes, "actions": actions}
+    return JSONResponse(content=jsonable_encoder(body, custom_encoder={ObjectId: str}), headers=headers)
+
+@api_router.get("/bot/events/{guild_id}")
+async def stream_guild_events(guild_id: str):
+    """Server-sent events for each strike and moderation action recorded in the guild"""
+    subscriber = event_broker.subscribe(guild_id)
+    
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), timeout=EVENT_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            event_broker.unsubscribe(guild_id, subscriber)
+    
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Bot workers insert strikes and actions in another process, so the API relays them from a change stream
+MODERATION_EVENTS = {"strikes": "strike", "mod_actions": "mod_action"}
+
+async def relay_moderation_events():
+    """Publish strikes and actions inserted by bot workers (BOT_RUN_MODE=process; requires a replica set)"""
+    pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": list(MODERATION_EVENTS)}}}]
+    resume_token = None
+    delay = 1
+    while True:
+        try:
+            async with api_db.watch(pipeline, resume_after=resume_token) as stream:
+                delay = 1
+                async for change in stream:
+                    document = change['fullDocument']
+                    event_broker.publish(document.get('guild_id'), MODERATION_EVENTS[change['ns']['coll']], document)
+                    resume_token = stream.resume_token
+        except OperationFailure as e:
+            # Usually the resume point fell off the oplog
+            print(f"Moderation event stream failed, restarting without resuming in {delay}s: {e}")
+            resume_token = None
+        except Exception as e:
+            print(f"Moderation event stream stopped, retrying in {delay}s: {e}")
+        
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 60)
+        if resume_token is None:
+            # Events inserted while the stream was down are gone; dashboards refetch on overflow
+            event_broker.overflow_all()
+
+# Streaming exports: collection, time-range field, sort and CSV columns per export kind
+EXPORTS = {
+    "strikes": ("strikes", "timestamp", TIMELINE_SORT,
+                ["_id", "user_id", "guild_id", "reason", "moderator_id", "timestamp"]),
+    "actions": ("mod_actions", "timestamp", TIMELINE_SORT,
+                ["_id", "action", "target_id", "moderator_id", "reason", "duration", "guild_id", "timestamp"]),
+    "members": ("members", "join_date", MEMBERS_SORT,
+                ["_id", "user_id", "username", "guild_id", "join_date", "strike_count", "total_messages", "last_active"]),
+}
+EXPORT_CHUNK_ROWS = 500
+
+def _export_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def _export_rows(cursor, export_format: str, columns: List[str]):
+    """Yield the cursor as NDJSON or CSV text in chunks of EXPORT_CHUNK_ROWS rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        writer.writerow(columns)
+
+    rows = 0
+    async for document in cursor:
+        if export_format == "csv":
+            writer.writerow([_export_value(document.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps(document, default=_export_value, ensure_ascii=False))
+            buffer.write("\n")
+
+        rows += 1
+        if rows % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+@api_router.get("/bot/export/{guild_id}/{kind}")
+async def export_guild_data(guild_id: str, kind: str, format: str = "ndjson", start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Stream every strike, moderation action or member of a guild without buffering the result"""
+    if kind not in EXPORTS:
+        raise HTTPException(status_code=404, detail=f"Unknown export '{kind}', expected one of: {', '.join(EXPORTS)}")
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'csv'")
+    
+    collection_name, time_field, sort, columns = EXPORTS[kind]
+    query = {"guild_id": guild_id}
+    if start or end:
+        query[time_field] = {}
+        if start:
+            query[time_field]["$gte"] = start
+        if end:
+            query[time_field]["$lte"] = end
+    
+    cursor = api_db[collection_name].find(query).sort(sort).batch_size(1000)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _export_rows(cursor, format, columns),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{kind}-{guild_id}.{format}"'}
+    )
 
 # Start Discord Bot in separate thread
 def start_discord_bot():
@@ -698,17 +2876,37 @@ def start_discord_bot():
     else:
         print("Discord token not provided")
 
+# Run Discord Bot on the API event loop
+async def run_discord_bot():
+    try:
+        await bot.start(DISCORD_TOKEN)
+    except Exception as e:
+        print(f"Failed to start Discord bot: {e}")
+
 # Discord bot startup
 discord_bot_task = None
+moderation_relay_task = None
 
 @app.on_event("startup")
 async def startup_event():
-    global discord_bot_task
-    if DISCORD_TOKEN and not discord_bot_task:
-        # Start bot in background
-        bot_thread = threading.Thread(target=start_discord_bot, daemon=True)
-        bot_thread.start()
-        print("Discord bot started in background thread")
+    global discord_bot_task, moderation_relay_task
+    await ensure_indexes(api_db)
+    await backfill_server_stats(api_db)
+    if PROFILING_ENABLED:
+        api_loop_monitor.start()
+    
+    if BOT_RUN_MODE == 'process':
+        print("Discord bot runs in bot_worker.py; serving bot state from its snapshots")
+        moderation_relay_task = asyncio.create_task(relay_moderation_events())
+    elif DISCORD_TOKEN and not discord_bot_task:
+        if BOT_RUN_MODE == 'loop':
+            discord_bot_task = asyncio.create_task(run_discord_bot())
+            print("Discord bot started on the API event loop")
+        else:
+            # Start bot in background
+            discord_bot_task = threading.Thread(target=start_discord_bot, name="discord-bot", daemon=True)
+            discord_bot_task.start()
+            print("Discord bot started in background thread")
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -730,5 +2928,15 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    if BOT_RUN_MODE == 'loop' and discord_bot_task:
+        await bot.close()
+        await discord_bot_task
+        cancel_weekly_reports()
+    
+    # Runs on the API loop, so flush pending counters through the API client. Without a bot
+    # in this process there is nothing to flush, and replaying a worker's journal would race it
+    if discord_bot_task:
+        await flush_buffers(api_db)
     client.close()
-    api_client.close()
+    if api_client is not client:
+        api_client.close()
@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the Discord bot backend hot paths.
+
+Run from the repository root, e.g. ``python backend_benchmark.py matcher``.
+Benchmarks import ``backend/server.py`` directly, so the backend requirements
+must be installed; those that touch Mongo use MONGO_URL (defaults to a local
+mongod) and a throwaway database. ``gateway`` runs against mongomock-motor
+unless given ``--mongo``, so it needs neither a Discord token nor a server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import string
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'discord_bot_benchmark')
+sys.path.insert(0, str(Path(__file__).parent / 'backend'))
+
+import server  # noqa: E402
+
+
+def _random_word(rng, min_len=3, max_len=10):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(min_len, max_len)))
+
+
+def _timed(func, iterations):
+    """Return per-call durations in microseconds"""
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1e6)
+    return durations
+
+
+def _report(name, durations):
+    durations = sorted(durations)
+    p99 = durations[min(len(durations) - 1, int(len(durations) * 0.99))]
+    print(f"{name:<28} mean {statistics.mean(durations):9.2f}µs  p50 {statistics.median(durations):9.2f}µs  p99 {p99:9.2f}µs")
+
+
+def bench_matcher(args):
+    """Compiled ForbiddenWordMatcher vs the old per-message substring loop"""
+    rng = random.Random(args.seed)
+    words = list({_random_word(rng) for _ in range(args.words)})
+    messages = []
+    for _ in range(args.messages):
+        body = [_random_word(rng, 2, 8) for _ in range(rng.randint(3, 40))]
+        if rng.random() < 0.05:
+            body.insert(rng.randrange(len(body) + 1), rng.choice(words))
+        messages.append(' '.join(body))
+
+    print(f"\n=== Forbidden word matching: {len(words)} words, {len(messages)} messages ===")
+
+    def substring_loop():
+        for content in messages:
+            content_lower = content.lower()
+            any(word in content_lower for word in words)
+
+    build_start = time.perf_counter()
+    matcher = server.ForbiddenWordMatcher(words)
+    print(f"Matcher build: {(time.perf_counter() - build_start) * 1000:.2f}ms")
+
+    def compiled_matcher():
+        for content in messages:
+            matcher.match(content)
+
+    per_message = len(messages)
+    _report('substring loop (per msg)', [d / per_message for d in _timed(substring_loop, args.iterations)])
+    _report('compiled matcher (per msg)', [d / per_message for d in _timed(compiled_matcher, args.iterations)])
+
+
+async def _bench_pagination(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    database = client[f"{os.environ['DB_NAME']}_{uuid.uuid4().hex[:8]}"]
+    try:
+        print(f"\n=== Pagination: {args.documents} strikes, pages of {args.limit} ===")
+        now = datetime.utcnow()
+        for offset in range(0, args.documents, 10000):
+            await database.strikes.insert_many([
+                {"_id": str(server.ObjectId()), "guild_id": "bench", "user_id": str(i % 500),
+                 "reason": "benchmark", "moderator_id": "0", "timestamp": now - timedelta(seconds=i)}
+                for i in range(offset, min(offset + 10000, args.documents))
+            ])
+        await server.ensure_indexes(database)
+
+        query = {"guild_id": "bench"}
+        for page in args.pages:
+            skip = page * args.limit
+            if skip >= args.documents:
+                continue
+
+            # Cursor for the page, taken from the last document of the previous page (untimed)
+            cursor = ''
+            if skip:
+                previous = await database.strikes.find(query).sort(server.TIMELINE_SORT).skip(skip - 1).limit(1).to_list(length=1)
+                cursor = server.encode_cursor(previous[0], server.TIMELINE_SORT)
+
+            skip_times, cursor_times = [], []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                await server.paginate(database.strikes, query, server.TIMELINE_SORT, skip, args.limit, None)
+                skip_times.append((time.perf_counter() - start) * 1000)
+
+                start = time.perf_counter()
+                await server.paginate(database.strikes, query, server.TIMELINE_SORT, 0, args.limit, cursor)
+                cursor_times.append((time.perf_counter() - start) * 1000)
+
+            print(f"page {page:>6}: skip p50 {statistics.median(skip_times):8.2f}ms   cursor p50 {statistics.median(cursor_times):8.2f}ms")
+    finally:
+        await client.drop_database(database.name)
+        client.close()
+
+
+def bench_pagination(args):
+    """skip/limit vs keyset cursor latency at increasing page depth (needs Mongo)"""
+    asyncio.run(_bench_pagination(args))
+
+
+async def _gateway_load(rate, duration, processed):
+    """Simulate gateway traffic: decode a MESSAGE_CREATE payload and run the hot-path checks"""
+    payload = json.dumps({
+        "t": "MESSAGE_CREATE",
+        "d": {"id": "1", "channel_id": "2", "guild_id": "3", "author": {"id": "4", "username": "user"},
+              "content": " ".join(["hello world مرحبا"] * 20), "embeds": [], "mentions": []}
+    })
+    matcher = server.ForbiddenWordMatcher([f"word{i}" for i in range(2000)])
+    buffer = server.ActivityBuffer(None)
+
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration:
+        for _ in range(int(elapsed * rate) - processed[0]):
+            event = json.loads(payload)["d"]
+            matcher.match(event["content"])
+            buffer.record(event["guild_id"], event["author"]["id"])
+            processed[0] += 1
+        await asyncio.sleep(0.001)
+
+
+async def _api_probes(duration, interval):
+    """Call an API handler every ``interval`` seconds, timing scheduling delay plus handling"""
+    latencies = []
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        scheduled = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        await server.get_bot_status()
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+    return latencies
+
+
+async def _run_mode(mode, args):
+    processed = [0]
+    if mode == 'loop':
+        load = asyncio.create_task(_gateway_load(args.rate, args.duration, processed))
+        latencies = await _api_probes(args.duration, args.interval)
+        await load
+    else:
+        load = threading.Thread(target=lambda: asyncio.run(_gateway_load(args.rate, args.duration, processed)))
+        load.start()
+        latencies = await _api_probes(args.duration, args.interval)
+        load.join()
+    return latencies, processed[0] / args.duration
+
+
+def bench_runmode(args):
+    """API latency under simulated gateway load, bot on its own thread vs on the API loop"""
+    print(f"\n=== Bot run mode: {args.rate} gateway events/s for {args.duration}s ===")
+    for mode in ('thread', 'loop'):
+        latencies, achieved = asyncio.run(_run_mode(mode, args))
+        latencies.sort()
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{mode:<7} API p50 {statistics.median(latencies):7.2f}ms  p99 {p99:7.2f}ms  gateway {achieved:9.0f} events/s")
+
+
+def _page_documents(kind, rows, rng):
+    """Documents shaped like a page read from Mongo (native ObjectIds and datetimes)"""
+    now = datetime.utcnow()
+    if kind == 'members':
+        return [{"_id": server.ObjectId(), "user_id": str(rng.getrandbits(60)), "username": f"user{i}#0001",
+                 "guild_id": "bench", "join_date": now - timedelta(days=rng.randint(0, 900)),
+                 "strike_count": rng.randint(0, 5), "total_messages": rng.randint(0, 5000),
+                 "last_active": now - timedelta(minutes=rng.randint(0, 10000)), "active_role_granted": False}
+                for i in range(rows)]
+    if kind == 'strikes':
+        return [{"_id": server.ObjectId(), "user_id": str(rng.getrandbits(60)), "guild_id": "bench",
+                 "reason": "Inappropriate language", "moderator_id": str(rng.getrandbits(60)),
+                 "timestamp": now - timedelta(seconds=i)}
+                for i in range(rows)]
+    return [{"_id": server.ObjectId(), "action": rng.choice(["kick", "timeout", "purge"]), "target_id": str(rng.getrandbits(60)),
+             "moderator_id": str(rng.getrandbits(60)), "reason": "لا يوجد سبب / No reason provided", "duration": 60,
+             "guild_id": "bench", "timestamp": now - timedelta(seconds=i)}
+            for i in range(rows)]
+
+
+# Fields a listing typically needs, as passed in ?fields=
+PAGE_FIELDS = {
+    'members': "user_id,username,strike_count",
+    'strikes': "user_id,reason",
+    'actions': "action,target_id,reason",
+}
+
+
+def bench_encoding(args):
+    """Response encoding time and payload size for list pages: jsonable_encoder vs FastJSONResponse, with and without fields="""
+    rng = random.Random(args.seed)
+    print(f"\n=== List response encoding: {args.rows}-row pages, FastJSONResponse via {'orjson' if server.orjson else 'json'} ===")
+    for kind, sort in (('members', server.MEMBERS_SORT), ('strikes', server.TIMELINE_SORT), ('actions', server.TIMELINE_SORT)):
+        documents = _page_documents(kind, args.rows, rng)
+        # What Mongo returns for the projection (plus _id, which it always includes)
+        projection = server.parse_fields(PAGE_FIELDS[kind], sort)
+        projected = [{key: value for key, value in document.items() if key in projection or key == '_id'} for document in documents]
+
+        variants = [
+            ('jsonable_encoder', lambda: server.JSONResponse(server.encode_documents(documents)).body),
+            ('FastJSONResponse', lambda: server.FastJSONResponse(documents).body),
+            ('Fast + fields', lambda: server.FastJSONResponse(projected).body),
+        ]
+        for name, encode in variants:
+            size = len(encode())
+            durations = _timed(encode, args.iterations)
+            print(f"{kind:<8} {name:<17} p50 {statistics.median(durations) / 1000:8.2f}ms  payload {size / 1024:8.1f}KiB")
+
+
+def bench_documents(args):
+    """Per-event cost of building strike/mod-action documents: Pydantic model + .dict() vs the hot-path builders"""
+    print(f"\n=== Moderation documents: {args.events} events ===")
+    variants = [
+        ('Strike model', lambda: server.Strike(user_id="1", guild_id="2", reason="spam", moderator_id="3").dict(by_alias=True)),
+        ('strike_document', lambda: server.strike_document("1", "2", "spam", "3")),
+        ('ModAction model', lambda: server.ModAction(action="timeout", target_id="1", moderator_id="3", reason="spam",
+                                                     duration=60, guild_id="2").dict(by_alias=True)),
+        ('mod_action_document', lambda: server.mod_action_document("timeout", "1", "3", "spam", "2", duration=60)),
+    ]
+    for name, build in variants:
+        durations = _timed(build, args.events)
+
+        # Peak memory while building one document (transient allocations included) and what the document retains
+        tracemalloc.start()
+        peaks, retained = [], []
+        for _ in range(min(args.events, 2000)):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            document = build()
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - base)
+            retained.append(current - base)
+            del document
+        tracemalloc.stop()
+
+        print(f"{name:<20} p50 {statistics.median(durations):7.2f}µs  peak {statistics.median(peaks):6.0f} B/event  "
+              f"retained {statistics.median(retained):5.0f} B/event")
+
+
+# Driver calls counted as Mongo operations by the gateway load test
+MONGO_OPERATIONS = {
+    'aggregate', 'bulk_write', 'count_documents', 'delete_many', 'delete_one', 'find', 'find_one',
+    'find_one_and_update', 'insert_many', 'insert_one', 'replace_one', 'update_many', 'update_one',
+}
+
+
+class _CountingCollection:
+    """Forwards to a collection, counting each driver call by operation"""
+
+    def __init__(self, collection, ops):
+        self._collection = collection
+        self._ops = ops
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name not in MONGO_OPERATIONS:
+            return attr
+
+        def counted(*args, **kwargs):
+            self._ops[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+class _CountingDatabase:
+    def __init__(self, database, ops):
+        self._database = database
+        self._ops = ops
+
+    def __getattr__(self, name):
+        return _CountingCollection(getattr(self._database, name), self._ops)
+
+    __getitem__ = __getattr__
+
+
+class _FakeChannel:
+    def __init__(self, channel_id):
+        self.id = channel_id
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+    async def purge(self, limit):
+        return [None] * limit
+
+
+class _FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.shard_id = 0
+        self.members = []
+        self.roles = []
+
+
+class _FakeMember:
+    """Just enough of discord.Member for the gateway handlers and commands"""
+    bot = False
+    avatar = None
+
+    def __init__(self, user_id, guild):
+        self.id = user_id
+        self.guild = guild
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return f"user{self.id}"
+
+    async def timeout(self, *args, **kwargs):
+        pass
+
+    async def kick(self, *args, **kwargs):
+        pass
+
+    async def add_roles(self, *args, **kwargs):
+        pass
+
+
+class _FakeMessage:
+    def __init__(self, author, channel, content):
+        self.id = random.getrandbits(63)
+        self.author = author
+        self.guild = author.guild
+        self.channel = channel
+        self.content = content
+        self.mentions = []
+        self.role_mentions = []
+        self._state = server.bot._connection
+
+    async def delete(self):
+        pass
+
+
+class _FakeContext:
+    def __init__(self, author, channel):
+        self.author = author
+        self.guild = author.guild
+        self.channel = channel
+        self.send = channel.send
+
+
+def _use_database(database):
+    """Point the bot's module-level state at ``database``"""
+    server.db = database
+    server.settings_cache.collection = database.bot_settings
+    server.activity_buffer.collection = database.members
+    server.stats_rollup.collection = database.server_stats
+    server.persistence_writer.database = database
+    server.role_promoter.collection = database.members
+    server.stats_engine.database = database
+
+
+async def _bench_gateway(args):
+    rng = random.Random(args.seed)
+    if args.mongo:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        client = AsyncMongoMockClient()
+    name = f"{os.environ['DB_NAME']}_{uuid.uuid4().hex[:8]}"
+    ops = Counter()
+    database = _CountingDatabase(client[name], ops)
+
+    guilds = [_FakeGuild(900000000000000000 + i) for i in range(args.guilds)]
+    channels = {guild.id: _FakeChannel(guild.id + 1) for guild in guilds}
+    for guild in guilds:
+        guild.members = [_FakeMember(guild.id * 10 + i, guild) for i in range(args.users)]
+    # on_message attributes strikes to the bot user; there is no gateway login here
+    server.bot._connection.user = _FakeMember(1, None)
+
+    _use_database(database)
+    await server.ensure_indexes(client[name])
+    await server.init_guild_settings(database, [str(guild.id) for guild in guilds])
+    await server.strike_counts.load(database, [str(guild.id) for guild in guilds])
+    server.activity_buffer.start()
+    server.stats_rollup.start()
+    server.persistence_writer.start()
+    server.role_promoter.start()
+    ops.clear()
+
+    commands = [
+        lambda ctx, target: server.kick_member.callback(ctx, target, reason="load test"),
+        lambda ctx, target: server.mute_member.callback(ctx, target, 5, reason="load test"),
+        lambda ctx, target: server.purge_messages.callback(ctx, 10),
+        lambda ctx, target: server.server_stats.callback(ctx),
+    ]
+    words = [_random_word(rng, 2, 8) for _ in range(200)]
+
+    def next_event():
+        guild = rng.choice(guilds)
+        channel = channels[guild.id]
+        roll = rng.random()
+        if roll < args.join_ratio:
+            member = _FakeMember(rng.getrandbits(60), guild)
+            return 'join', server.on_member_join(member)
+        if roll < args.join_ratio + args.command_ratio:
+            ctx = _FakeContext(rng.choice(guild.members), channel)
+            return 'command', rng.choice(commands)(ctx, rng.choice(guild.members))
+        content = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+        if rng.random() < args.forbidden_ratio:
+            content += ' spam'
+        return 'message', server.on_message(_FakeMessage(rng.choice(guild.members), channel, content))
+
+    latencies = {'message': [], 'join': [], 'command': []}
+    errors = Counter()
+
+    async def run_event(kind, coro, scheduled):
+        try:
+            await coro
+        except Exception as e:
+            errors[f"{kind}: {type(e).__name__}"] += 1
+        latencies[kind].append((time.perf_counter() - scheduled) * 1000)
+
+    print(f"\n=== Gateway load: {args.rate} events/s for {args.duration}s, {args.guilds} guilds x {args.users} users, "
+          f"{'MONGO_URL' if args.mongo else 'mongomock'} ===")
+    pending = set()
+    scheduled = 0
+    start = time.perf_counter()
+    try:
+        while (elapsed := time.perf_counter() - start) < args.duration:
+            for _ in range(int(elapsed * args.rate) - scheduled):
+                kind, coro = next_event()
+                # Handlers run as their own tasks, the way discord.py dispatches gateway events
+                task = asyncio.create_task(run_event(kind, coro, time.perf_counter()))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                scheduled += 1
+            await asyncio.sleep(0.001)
+        await asyncio.gather(*pending)
+        wall = time.perf_counter() - start
+        await server.flush_buffers(database)
+
+        handled = sum(len(values) for values in latencies.values())
+        print(f"throughput {handled / wall:9.0f} events/s ({handled} events in {wall:.2f}s)")
+        for kind, values in latencies.items():
+            if not values:
+                continue
+            values.sort()
+            p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+            print(f"{kind:<8} n={len(values):<7} p50 {statistics.median(values):8.2f}ms  p99 {p99:8.2f}ms")
+        messages = len(latencies['message']) or 1
+        print(f"Mongo ops per message {sum(ops.values()) / messages:.3f}  "
+              f"({', '.join(f'{op} {count}' for op, count in ops.most_common())})")
+        for error, count in errors.most_common():
+            print(f"errors   {error} x{count}")
+    finally:
+        await client.drop_database(name)
+        if args.mongo:
+            client.close()
+
+
+def bench_gateway(args):
+    """Replay synthetic messages, joins and commands through the bot handlers (mongomock, or MONGO_URL with --mongo)"""
+    asyncio.run(_bench_gateway(args))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    matcher = subparsers.add_parser('matcher', help=bench_matcher.__doc__)
+    matcher.add_argument('--words', type=int, default=5000)
+    matcher.add_argument('--messages', type=int, default=2000)
+    matcher.add_argument('--iterations', type=int, default=5)
+    matcher.add_argument('--seed', type=int, default=42)
+    matcher.set_defaults(func=bench_matcher)
+
+    pagination = subparsers.add_parser('pagination', help=bench_pagination.__doc__)
+    pagination.add_argument('--documents', type=int, default=200000)
+    pagination.add_argument('--limit', type=int, default=50)
+    pagination.add_argument('--pages', type=int, nargs='+', default=[0, 10, 100, 1000, 3000])
+    pagination.add_argument('--iterations', type=int, default=20)
+    pagination.set_defaults(func=bench_pagination)
+
+    runmode = subparsers.add_parser('runmode', help=bench_runmode.__doc__)
+    runmode.add_argument('--rate', type=int, default=2000)
+    runmode.add_argument('--duration', type=float, default=5)
+    runmode.add_argument('--interval', type=float, default=0.01)
+    runmode.set_defaults(func=bench_runmode)
+
+    encoding = subparsers.add_parser('encoding', help=bench_encoding.__doc__)
+    encoding.add_argument('--rows', type=int, default=1000)
+    encoding.add_argument('--iterations', type=int, default=50)
+    encoding.add_argument('--seed', type=int, default=42)
+    encoding.set_defaults(func=bench_encoding)
+
+    documents = subparsers.add_parser('documents', help=bench_documents.__doc__)
+    documents.add_argument('--events', type=int, default=20000)
+    documents.set_defaults(func=bench_documents)
+
+    gateway = subparsers.add_parser('gateway', help=bench_gateway.__doc__)
+    gateway.add_argument('--rate', type=int, default=500)
+    gateway.add_argument('--duration', type=float, default=10)
+    gateway.add_argument('--guilds', type=int, default=20)
+    gateway.add_argument('--users', type=int, default=200)
+    gateway.add_argument('--join-ratio', type=float, default=0.02)
+    gateway.add_argument('--command-ratio', type=float, default=0.01)
+    gateway.add_argument('--forbidden-ratio', type=float, default=0.02)
+    gateway.add_argument('--mongo', action='store_true', help="use MONGO_URL instead of mongomock-motor")
+    gateway.add_argument('--seed', type=int, default=42)
+    gateway.set_defaults(func=bench_gateway)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -273,6 +273,138 @@ class DiscordBotBackendTest(unittest.TestCase):
         
         print(f"✅ Successfully retrieved moderation actions")
     
+    def test_09_guild_stats_history(self):
+        """Test daily stats history endpoint"""
+        if not self.guild_id:
+            # Use the first guild from the guilds endpoint
+            response = requests.get(f"{self.base_url}/bot/guilds")
+            guilds = response.json()
+            if guilds:
+                self.guild_id = guilds[0]["id"]
+            else:
+                self.skipTest("No guild ID available for testing")
+        
+        print("\n=== Testing Guild Stats History ===")
+        print(f"Using guild ID: {self.guild_id}")
+        
+        response = requests.get(f"{self.base_url}/bot/stats/{self.guild_id}/history?days=7")
+        self.assertEqual(response.status_code, 200, "History endpoint should return 200")
+        
+        history = response.json()
+        print(f"Found {len(history)} daily rollups")
+        
+        # Verify rollup structure if we have any
+        for day in history:
+            self.assertIn("date", day, "Rollup should have a date")
+            self.assertIn("messages_today", day, "Rollup should have messages_today")
+        
+        dates = [day["date"] for day in history]
+        self.assertEqual(dates, sorted(dates), "History should be ordered oldest first")
+        
+        # Invalid dates are rejected
+        response = requests.get(f"{self.base_url}/bot/stats/{self.guild_id}/history?start=not-a-date")
+        self.assertEqual(response.status_code, 400, "Invalid dates should return 400")
+        
+        print(f"✅ Successfully retrieved guild stats history")
+    
+    def test_10_cursor_pagination(self):
+        """Test keyset cursor pagination on list endpoints"""
+        if not self.guild_id:
+            # Use the first guild from the guilds endpoint
+            response = requests.get(f"{self.base_url}/bot/guilds")
+            guilds = response.json()
+            if guilds:
+                self.guild_id = guilds[0]["id"]
+            else:
+                self.skipTest("No guild ID available for testing")
+        
+        print("\n=== Testing Cursor Pagination ===")
+        print(f"Using guild ID: {self.guild_id}")
+        
+        for endpoint in ("members", "strikes", "actions"):
+            # An empty cursor requests the first page
+            response = requests.get(f"{self.base_url}/bot/{endpoint}/{self.guild_id}?cursor=&limit=5")
+            self.assertEqual(response.status_code, 200, f"{endpoint} cursor pagination should return 200")
+            
+            page = response.json()
+            self.assertIn("items", page, "Cursor page should include items")
+            self.assertIn("next_cursor", page, "Cursor page should include next_cursor")
+            
+            if page["next_cursor"]:
+                response = requests.get(f"{self.base_url}/bot/{endpoint}/{self.guild_id}?cursor={page['next_cursor']}&limit=5")
+                self.assertEqual(response.status_code, 200, f"{endpoint} next page should return 200")
+                next_ids = {item["_id"] for item in response.json()["items"]}
+                self.assertFalse(next_ids & {item["_id"] for item in page["items"]}, "Pages should not overlap")
+            
+            print(f"{endpoint}: {len(page['items'])} items on first page")
+        
+        response = requests.get(f"{self.base_url}/bot/strikes/{self.guild_id}?cursor=garbage")
+        self.assertEqual(response.status_code, 400, "Invalid cursor should return 400")
+        
+        print(f"✅ Cursor pagination works")
+    
+    def test_11_streaming_export(self):
+        """Test NDJSON and CSV export endpoints"""
+        if not self.guild_id:
+            # Use the first guild from the guilds endpoint
+            response = requests.get(f"{self.base_url}/bot/guilds")
+            guilds = response.json()
+            if guilds:
+                self.guild_id = guilds[0]["id"]
+            else:
+                self.skipTest("No guild ID available for testing")
+        
+        print("\n=== Testing Streaming Export ===")
+        print(f"Using guild ID: {self.guild_id}")
+        
+        for kind in ("strikes", "actions", "members"):
+            response = requests.get(f"{self.base_url}/bot/export/{self.guild_id}/{kind}?format=ndjson", stream=True)
+            self.assertEqual(response.status_code, 200, f"{kind} NDJSON export should return 200")
+            rows = [json.loads(line) for line in response.iter_lines() if line]
+            for row in rows:
+                self.assertEqual(row["guild_id"], self.guild_id, "Exported rows should belong to the guild")
+            
+            response = requests.get(f"{self.base_url}/bot/export/{self.guild_id}/{kind}?format=csv")
+            self.assertEqual(response.status_code, 200, f"{kind} CSV export should return 200")
+            self.assertTrue(response.text.startswith("_id,"), "CSV export should start with a header row")
+            
+            print(f"{kind}: exported {len(rows)} rows")
+        
+        response = requests.get(f"{self.base_url}/bot/export/{self.guild_id}/unknown")
+        self.assertEqual(response.status_code, 404, "Unknown export should return 404")
+        
+        print(f"✅ Streaming export works")
+    
+    def test_12_dashboard_etag(self):
+        """Test the combined dashboard endpoint and its conditional GET"""
+        if not self.guild_id:
+            # Use the first guild from the guilds endpoint
+            response = requests.get(f"{self.base_url}/bot/guilds")
+            guilds = response.json()
+            if guilds:
+                self.guild_id = guilds[0]["id"]
+            else:
+                self.skipTest("No guild ID available for testing")
+        
+        print("\n=== Testing Guild Dashboard ===")
+        print(f"Using guild ID: {self.guild_id}")
+        
+        response = requests.get(f"{self.base_url}/bot/dashboard/{self.guild_id}")
+        self.assertEqual(response.status_code, 200, "Dashboard should return 200")
+        data = response.json()
+        for key in ("stats", "settings", "strikes", "actions"):
+            self.assertIn(key, data, f"Dashboard should contain {key}")
+        etag = response.headers.get("ETag")
+        self.assertTrue(etag, "Dashboard should carry an ETag")
+        
+        response = requests.get(f"{self.base_url}/bot/dashboard/{self.guild_id}", headers={"If-None-Match": etag})
+        print(f"Revalidation status: {response.status_code}")
+        self.assertIn(response.status_code, (200, 304), "Revalidation should return 304, or 200 if the guild changed")
+        if response.status_code == 304:
+            self.assertEqual(response.headers.get("ETag"), etag, "304 should repeat the ETag")
+        
+        print(f"✅ Guild dashboard works")
+    
     def test_08_error_handling(self):
         """Test error handling for invalid requests"""
         print("\n=== Testing Error Handling ===")
@@ -304,7 +436,11 @@ if __name__ == "__main__":
         DiscordBotBackendTest('test_05_guild_members'),
         DiscordBotBackendTest('test_06_guild_strikes'),
         DiscordBotBackendTest('test_07_mod_actions'),
-        DiscordBotBackendTest('test_08_error_handling')
+        DiscordBotBackendTest('test_08_error_handling'),
+        DiscordBotBackendTest('test_09_guild_stats_history'),
+        DiscordBotBackendTest('test_10_cursor_pagination'),
+        DiscordBotBackendTest('test_11_streaming_export'),
+        DiscordBotBackendTest('test_12_dashboard_etag')
     ]
     
     # Run each test individually and continue even if one fails
@@ -28,6 +28,28 @@ function App() {
     }
   }, [selectedGuild]);
 
+  useEffect(() => {
+    if (!selectedGuild) return;
+
+    // Live strikes and moderation actions; EventSource reconnects on its own,
+    // and anything missed while disconnected is picked up by refetching
+    const source = new EventSource(`${API}/bot/events/${selectedGuild.id}`);
+    let connected = false;
+    source.onopen = () => {
+      if (connected) fetchGuildData();
+      connected = true;
+    };
+    source.addEventListener('strike', (event) => {
+      setStrikes((current) => [JSON.parse(event.data), ...current]);
+    });
+    source.addEventListener('mod_action', (event) => {
+      setModActions((current) => [JSON.parse(event.data), ...current]);
+    });
+    source.addEventListener('overflow', () => fetchGuildData());
+
+    return () => source.close();
+  }, [selectedGuild]);
+
   const fetchBotStatus = async () => {
     try {
       const response = await axios.get(`${API}/bot/status`);
@@ -59,17 +81,13 @@ function App() {
     if (!selectedGuild) return;
 
     try {
-      const [statsRes, settingsRes, strikesRes, actionsRes] = await Promise.all([
-        axios.get(`${API}/bot/stats/${selectedGuild.id}`),
-        axios.get(`${API}/bot/settings/${selectedGuild.id}`),
-        axios.get(`${API}/bot/strikes/${selectedGuild.id}`),
-        axios.get(`${API}/bot/actions/${selectedGuild.id}`)
-      ]);
-
-      setGuildStats(statsRes.data);
-      setSettings(settingsRes.data);
-      setStrikes(strikesRes.data);
-      setModActions(actionsRes.data);
+      // One request; the browser revalidates it with the ETag, so unchanged refreshes are 304s
+      const response = await axios.get(`${API}/bot/dashboard/${selectedGuild.id}`);
+
+      setGuildStats(response.data.stats);
+      setSettings(response.data.settings);
+      setStrikes(response.data.strikes);
+      setModActions(response.data.actions);
       setError(null);
     } catch (error) {
       console.error('Error fetching guild data:', error);
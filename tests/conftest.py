@@ -0,0 +1,30 @@
+"""Shared test setup: environment defaults for importing the backend, and scratch databases."""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'discord_bot_test')
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+
+@pytest.fixture
+def scratch_database(request):
+    """Set ``self.db`` to a throwaway database: on TEST_MONGO_URL when set, otherwise mongomock-motor"""
+    name = f"test_{uuid.uuid4().hex[:8]}"
+    url = os.environ.get('TEST_MONGO_URL')
+    if not url:
+        mongomock_motor = pytest.importorskip("mongomock_motor", reason="Set TEST_MONGO_URL or install mongomock-motor")
+        request.instance.db = mongomock_motor.AsyncMongoMockClient()[name]
+        yield request.instance.db
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    from pymongo import MongoClient
+    request.instance.db = AsyncIOMotorClient(url)[name]
+    yield request.instance.db
+    with MongoClient(url) as client:
+        client.drop_database(name)
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import unittest
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+def drain(subscriber):
+    return [subscriber.queue.get_nowait() for _ in range(subscriber.queue.qsize())]
+
+
+class EventBrokerTest(unittest.IsolatedAsyncioTestCase):
+    """Live strike/action events must reach the guild's subscribers without unbounded buffering"""
+
+    async def asyncSetUp(self):
+        self.broker = server.EventBroker(max_buffered=4)
+
+    async def test_events_reach_only_the_guilds_subscribers(self):
+        subscriber = self.broker.subscribe("1")
+        other = self.broker.subscribe("2")
+
+        self.broker.publish("1", "strike", {"user_id": "42", "_id": server.ObjectId()})
+        await asyncio.sleep(0)
+
+        messages = drain(subscriber)
+        self.assertEqual(len(messages), 1)
+        self.assertTrue(messages[0].startswith("event: strike\ndata: {"))
+        self.assertEqual(drain(other), [])
+
+    async def test_publish_from_another_thread(self):
+        subscriber = self.broker.subscribe("1")
+
+        thread = threading.Thread(target=self.broker.publish, args=("1", "mod_action", {"action": "kick"}))
+        thread.start()
+        thread.join()
+
+        message = await asyncio.wait_for(subscriber.queue.get(), timeout=1)
+        self.assertIn('"action": "kick"', message)
+
+    async def test_full_buffer_drops_oldest(self):
+        subscriber = self.broker.subscribe("1")
+
+        for i in range(6):
+            self.broker.publish("1", "strike", {"n": i})
+        await asyncio.sleep(0)
+
+        self.assertEqual([message.split('"n": ')[1][0] for message in drain(subscriber)], ["2", "3", "4", "5"])
+        self.assertFalse(subscriber.closed)
+
+    async def test_subscriber_a_whole_buffer_behind_is_disconnected(self):
+        subscriber = self.broker.subscribe("1")
+
+        for i in range(20):
+            self.broker.publish("1", "strike", {"n": i})
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscriber.closed)
+        self.assertEqual(drain(subscriber), ["event: overflow\ndata: {}\n\n", None])
+
+    async def test_drops_are_forgiven_once_the_subscriber_catches_up(self):
+        subscriber = self.broker.subscribe("1")
+
+        for _ in range(3):
+            for i in range(7):
+                self.broker.publish("1", "strike", {"n": i})
+            await asyncio.sleep(0)
+            drain(subscriber)
+
+        self.assertFalse(subscriber.closed)
+
+    async def test_overflow_all_disconnects_every_subscriber(self):
+        subscribers = [self.broker.subscribe("1"), self.broker.subscribe("2")]
+        self.broker.publish("1", "strike", {"n": 1})
+
+        self.broker.overflow_all()
+        await asyncio.sleep(0)
+
+        for subscriber in subscribers:
+            self.assertTrue(subscriber.closed)
+            self.assertEqual(drain(subscriber), ["event: overflow\ndata: {}\n\n", None])
+
+    async def test_unsubscribe_forgets_the_guild(self):
+        subscriber = self.broker.subscribe("1")
+        self.broker.unsubscribe("1", subscriber)
+
+        self.broker.publish("1", "strike", {"n": 1})
+        await asyncio.sleep(0)
+
+        self.assertEqual(drain(subscriber), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+class ForbiddenWordMatcherTest(unittest.TestCase):
+    """Forbidden words match whole words after normalization, never substrings"""
+
+    def assertMatches(self, words, content):
+        self.assertTrue(server.ForbiddenWordMatcher(words).match(content), content)
+
+    def assertNotMatches(self, words, content):
+        self.assertFalse(server.ForbiddenWordMatcher(words).match(content), content)
+
+    def test_whole_words_only(self):
+        self.assertMatches(["spam"], "stop the SPAM!")
+        self.assertNotMatches(["spam"], "you spammer")
+
+    def test_arabic_diacritics_and_letter_variants(self):
+        self.assertMatches(["كلمة"], "هذه كَلِمَة سيئة")
+        self.assertMatches(["كلمة"], "هذه كلمه سيئة")
+        self.assertMatches(["أحمق"], "يا احمق")
+
+    def test_arabic_prefixed_forms_do_not_match(self):
+        # Documented limitation: prefixes are part of the word
+        self.assertNotMatches(["كلمة"], "هذه الكلمة سيئة")
+
+    def test_phrases(self):
+        self.assertMatches(["free nitro"], "get FREE   nitro here")
+        self.assertNotMatches(["free nitro"], "nitro is not free")
+
+    def test_terms_with_punctuation(self):
+        self.assertMatches(["c++"], "I write c++.")
+        self.assertNotMatches(["c++"], "I write c")
+        self.assertMatches(["f*ck"], "oh f*ck")
+        self.assertNotMatches(["f*ck"], "oh fuck")
+
+    def test_fullwidth_text(self):
+        self.assertMatches(["spam"], "ｓｐａｍ")
+
+    def test_symbol_terms_match_anywhere(self):
+        self.assertMatches(["😀"], "hi 😀")
+        self.assertMatches(["卐"], "look 卐 here")
+        self.assertMatches(["😀"], "hi😀😀")
+        self.assertMatches(["spam", "!!"], "wow!!")
+        self.assertNotMatches(["😀"], "hi 😃")
+
+    def test_empty_terms_are_ignored(self):
+        self.assertNotMatches(["", "  "], "hello")
+
+
+if __name__ == "__main__":
+    unittest.main()
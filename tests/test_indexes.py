@@ -0,0 +1,124 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+def plan_stages(plan):
+    """Collect every stage name in an explain() winning plan"""
+    stages = set()
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.add(plan['stage'])
+        for value in plan.values():
+            stages |= plan_stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            stages |= plan_stages(value)
+    return stages
+
+
+@unittest.skipUnless(os.environ.get('TEST_MONGO_URL'), "explain() needs a real mongod (set TEST_MONGO_URL)")
+@pytest.mark.usefixtures("scratch_database")
+class IndexProvisioningTest(unittest.IsolatedAsyncioTestCase):
+    """Hot queries must be served by the indexes created in ensure_indexes"""
+
+    async def asyncSetUp(self):
+        now = datetime.utcnow()
+        await self.db.members.insert_many([
+            {"user_id": str(i), "guild_id": str(i % 5), "join_date": now - timedelta(days=i),
+             "total_messages": i, "strike_count": i % 4}
+            for i in range(200)
+        ])
+        for collection in (self.db.strikes, self.db.mod_actions):
+            await collection.insert_many([
+                {"guild_id": str(i % 5), "user_id": str(i), "timestamp": now - timedelta(minutes=i)}
+                for i in range(200)
+            ])
+        await self.db.bot_settings.insert_many([{"guild_id": str(i)} for i in range(5)])
+
+        await server.ensure_indexes(self.db)
+
+    async def assertIndexed(self, cursor):
+        explain = await cursor.explain()
+        stages = plan_stages(explain['queryPlanner']['winningPlan'])
+        self.assertIn('IXSCAN', stages)
+        self.assertNotIn('COLLSCAN', stages)
+
+    async def assertNoBlockingSort(self, cursor):
+        explain = await cursor.explain()
+        self.assertNotIn('SORT', plan_stages(explain['queryPlanner']['winningPlan']))
+
+    async def test_member_lookup(self):
+        await self.assertIndexed(self.db.members.find({"user_id": "3", "guild_id": "3"}))
+
+    async def test_active_member_scan(self):
+        week_ago = datetime.utcnow() - timedelta(days=7)
+        await self.assertIndexed(self.db.members.find({
+            "guild_id": "1",
+            "join_date": {"$lte": week_ago},
+            "total_messages": {"$gte": 10},
+            "strike_count": {"$lt": 3}
+        }))
+
+    async def test_members_page(self):
+        await self.assertIndexed(self.db.members.find({"guild_id": "1"}).sort(server.MEMBERS_SORT).limit(50))
+        await self.assertNoBlockingSort(self.db.members.find({"guild_id": "1"}).sort(server.MEMBERS_SORT).limit(50))
+
+    async def test_strikes_by_guild_newest_first(self):
+        await self.assertIndexed(self.db.strikes.find({"guild_id": "1"}).sort(server.TIMELINE_SORT).limit(50))
+
+    async def test_mod_actions_by_guild_newest_first(self):
+        await self.assertIndexed(self.db.mod_actions.find({"guild_id": "1"}).sort(server.TIMELINE_SORT).limit(50))
+
+    async def test_strikes_keyset_page(self):
+        first = await self.db.strikes.find({"guild_id": "1"}).sort(server.TIMELINE_SORT).limit(10).to_list(length=10)
+        values = server.decode_cursor(server.encode_cursor(first[-1], server.TIMELINE_SORT), server.TIMELINE_SORT)
+        query = {"$and": [{"guild_id": "1"}, server.keyset_filter(server.TIMELINE_SORT, values)]}
+        await self.assertIndexed(self.db.strikes.find(query).sort(server.TIMELINE_SORT).limit(10))
+
+    async def test_timeline_sort_served_by_index(self):
+        await self.assertNoBlockingSort(self.db.strikes.find({"guild_id": "1"}).sort(server.TIMELINE_SORT).limit(50))
+
+    async def test_settings_lookup(self):
+        await self.assertIndexed(self.db.bot_settings.find({"guild_id": "1"}))
+
+    async def test_unique_member_per_guild(self):
+        from pymongo.errors import DuplicateKeyError
+        with self.assertRaises(DuplicateKeyError):
+            await self.db.members.insert_one({"user_id": "3", "guild_id": "3"})
+
+
+@pytest.mark.usefixtures("scratch_database")
+class DuplicateMemberMergeTest(unittest.IsolatedAsyncioTestCase):
+    """Members duplicated before the unique index existed must be merged so the index can be built"""
+
+    async def test_duplicates_are_merged_before_the_unique_index(self):
+        now = datetime.utcnow()
+        await self.db.members.insert_many([
+            {"user_id": "3", "guild_id": "1", "username": "old", "join_date": now - timedelta(days=30),
+             "strike_count": 2, "total_messages": 40, "last_active": now - timedelta(days=1), "active_role_granted": True},
+            {"user_id": "3", "guild_id": "1", "username": "new", "join_date": now - timedelta(days=2),
+             "strike_count": 0, "total_messages": 0, "last_active": now - timedelta(days=2)},
+            {"user_id": "4", "guild_id": "1", "username": "other", "join_date": now, "strike_count": 1, "total_messages": 5},
+        ])
+
+        await server.ensure_indexes(self.db)
+
+        members = await self.db.members.find({"user_id": "3"}).to_list(length=None)
+        self.assertEqual(len(members), 1)
+        self.assertEqual(members[0]["username"], "new")
+        self.assertEqual((members[0]["strike_count"], members[0]["total_messages"]), (2, 40))
+        self.assertTrue(members[0]["active_role_granted"])
+        self.assertEqual(await self.db.members.count_documents({}), 2)
+
+        from pymongo.errors import DuplicateKeyError
+        with self.assertRaises(DuplicateKeyError):
+            await self.db.members.insert_one({"user_id": "3", "guild_id": "1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+class MetricsRenderingTest(unittest.TestCase):
+    """The registry must render valid Prometheus text for local and published metrics"""
+
+    def setUp(self):
+        self.registry = server.MetricsRegistry()
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.registry.histogram("phase_seconds", "Phase time", ["phase"], buckets=(0.01, 0.1, 1))
+        for value in (0.005, 0.01, 0.05, 5):
+            histogram.observe(value, phase="settings")
+
+        lines = server.render_metrics(({}, self.registry.collect())).splitlines()
+
+        self.assertIn('# TYPE phase_seconds histogram', lines)
+        self.assertIn('phase_seconds_bucket{phase="settings",le="0.01"} 2', lines)
+        self.assertIn('phase_seconds_bucket{phase="settings",le="0.1"} 3', lines)
+        self.assertIn('phase_seconds_bucket{phase="settings",le="1"} 3', lines)
+        self.assertIn('phase_seconds_bucket{phase="settings",le="+Inf"} 4', lines)
+        self.assertIn('phase_seconds_count{phase="settings"} 4', lines)
+
+    def test_published_families_merge_with_instance_label(self):
+        counter = self.registry.counter("rate_limited", "429 responses", ["route"])
+        counter.inc(route='/channels/{id}/messages')
+
+        text = server.render_metrics(({}, self.registry.collect()), ({"instance": "shards-0"}, self.registry.collect()))
+
+        self.assertEqual(text.count('# HELP rate_limited'), 1)
+        self.assertIn('rate_limited_total{route="/channels/{id}/messages"} 1', text)
+        self.assertIn('rate_limited_total{route="/channels/{id}/messages",instance="shards-0"} 1', text)
+
+    def test_label_values_are_escaped(self):
+        self.registry.gauge("latency", "Latency", ["shard"]).set(0.5, shard='a"b\\c')
+
+        self.assertIn('latency{shard="a\\"b\\\\c"} 0.5', server.render_metrics(({}, self.registry.collect())))
+
+    def test_discord_routes_collapse_snowflakes(self):
+        self.assertEqual(
+            server.discord_route('/api/v10/guilds/123456789012345678/members/876543210987654321'),
+            '/guilds/{id}/members/{id}'
+        )
+
+    def test_discord_routes_hide_tokens(self):
+        self.assertEqual(
+            server.discord_route('/api/v10/interactions/123456789012345678/aW50ZXJhY3Rpb246MTIzNDU2Nzg5MDEyMzQ1Njc4OmFiYw/callback'),
+            '/interactions/{id}/{token}/callback'
+        )
+        self.assertEqual(
+            server.discord_route('/api/v10/webhooks/123456789012345678/aW50ZXJhY3Rpb246MTIz/messages/@original'),
+            '/webhooks/{id}/{token}/messages/@original'
+        )
+        self.assertEqual(
+            server.discord_route('/api/v10/channels/123456789012345678/messages/876543210987654321/reactions/%F0%9F%91%8D/@me'),
+            '/channels/{id}/messages/{id}/reactions/{emoji}/@me'
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
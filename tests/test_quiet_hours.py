@@ -0,0 +1,45 @@
+import unittest
+from datetime import datetime
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+class QuietHoursStateTest(unittest.TestCase):
+    """quiet_hours_state works in the guild's timezone and returns UTC deadlines"""
+
+    def test_overnight_window_in_utc(self):
+        self.assertEqual(
+            server.quiet_hours_state({}, datetime(2026, 1, 1, 23, 0)),
+            (True, datetime(2026, 1, 2, 8, 0))
+        )
+        self.assertEqual(
+            server.quiet_hours_state({}, datetime(2026, 1, 1, 12, 0)),
+            (False, datetime(2026, 1, 1, 22, 0))
+        )
+
+    def test_same_day_window(self):
+        settings = {"quiet_start": "01:00", "quiet_end": "06:00"}
+        self.assertEqual(server.quiet_hours_state(settings, datetime(2026, 1, 1, 3, 0)), (True, datetime(2026, 1, 1, 6, 0)))
+        self.assertEqual(server.quiet_hours_state(settings, datetime(2026, 1, 1, 7, 0)), (False, datetime(2026, 1, 2, 1, 0)))
+
+    def test_guild_timezone(self):
+        # 21:00 UTC is midnight in Riyadh (UTC+3): quiet until 08:00 local, 05:00 UTC
+        settings = {"timezone": "Asia/Riyadh"}
+        self.assertEqual(server.quiet_hours_state(settings, datetime(2026, 1, 1, 21, 0)), (True, datetime(2026, 1, 2, 5, 0)))
+
+    def test_dst_change(self):
+        # New York springs forward on 2026-03-08, so 08:00 local is 12:00 UTC that day
+        settings = {"timezone": "America/New_York"}
+        self.assertEqual(server.quiet_hours_state(settings, datetime(2026, 3, 8, 6, 30)), (True, datetime(2026, 3, 8, 12, 0)))
+
+    def test_unknown_timezone_falls_back_to_utc(self):
+        self.assertEqual(
+            server.quiet_hours_state({"timezone": "Not/AZone"}, datetime(2026, 1, 1, 12, 0)),
+            (False, datetime(2026, 1, 1, 22, 0))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
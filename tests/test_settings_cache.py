@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+import pytest
+
+server = pytest.importorskip("server")
+from pymongo.errors import ServerSelectionTimeoutError  # noqa: E402
+
+
+class SettingsCollection:
+    def __init__(self, settings):
+        self.settings = settings
+        self.reads = 0
+        self.down = False
+
+    async def find_one(self, query):
+        self.reads += 1
+        if self.down:
+            raise ServerSelectionTimeoutError("no servers available")
+        return dict(self.settings, guild_id=query["guild_id"])
+
+
+class SettingsCacheTest(unittest.IsolatedAsyncioTestCase):
+    """Expired settings must not make message handlers wait on (or fail with) Mongo"""
+
+    async def asyncSetUp(self):
+        self.collection = SettingsCollection({"strike_limit": 3})
+        self.cache = server.SettingsCache(self.collection, ttl=0)
+
+    async def test_expired_entry_is_served_while_refreshing(self):
+        await self.cache.get("1")
+        self.collection.settings = {"strike_limit": 5}
+
+        self.assertEqual((await self.cache.get("1"))["strike_limit"], 3)
+        await asyncio.sleep(0)
+        self.assertEqual(self.cache._entries["1"][1]["strike_limit"], 5)
+
+    async def test_failed_refresh_keeps_stale_entry(self):
+        await self.cache.get("1")
+        self.collection.down = True
+
+        for _ in range(3):
+            self.assertEqual((await self.cache.get("1"))["strike_limit"], 3)
+        await asyncio.sleep(0)
+
+        # One refresh at a time per guild
+        self.assertEqual(self.collection.reads, 2)
+        self.assertEqual((await self.cache.get("1"))["strike_limit"], 3)
+
+    async def test_missing_entry_is_read_inline(self):
+        self.collection.down = True
+
+        with self.assertRaises(ServerSelectionTimeoutError):
+            await self.cache.get("1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import datetime, timedelta
+
+import pytest
+
+server = pytest.importorskip("server")
+
+
+@pytest.mark.usefixtures("scratch_database")
+class ServerStatsBackfillTest(unittest.IsolatedAsyncioTestCase):
+    """Weekly stats must count events from before the rollups existed"""
+
+    async def asyncSetUp(self):
+        self.engine = server.StatsEngine(self.db, ttl=0)
+
+    async def test_weekly_counts_include_events_before_the_rollups(self):
+        now = datetime.utcnow()
+        await self.db.members.insert_many([
+            {"guild_id": "1", "user_id": str(i), "join_date": now - timedelta(days=i)} for i in range(3)
+        ])
+        await self.db.strikes.insert_many([{"guild_id": "1", "timestamp": now - timedelta(days=2)} for _ in range(4)])
+        await self.db.mod_actions.insert_one({"guild_id": "1", "timestamp": now})
+        # Today's rollup only saw the events since the upgrade
+        await self.db.server_stats.insert_one({"_id": "x", "guild_id": "1", "date": now.strftime('%Y-%m-%d'), "joins": 0, "mod_actions": 1})
+
+        for _ in range(2):
+            await self.db.migrations.delete_many({})
+            await server.backfill_server_stats(self.db)
+
+        stats = await self.engine.get("1")
+        self.assertEqual(stats["new_members_week"], 3)
+        self.assertEqual(stats["strikes_week"], 4)
+        self.assertEqual(stats["mod_actions_week"], 1)
+        self.assertEqual((await self.engine.weekly_totals(["1"]))["1"]["strikes"], 4)
+
+    async def test_backfill_runs_once(self):
+        await server.backfill_server_stats(self.db)
+        await self.db.strikes.insert_one({"guild_id": "1", "timestamp": datetime.utcnow()})
+
+        await server.backfill_server_stats(self.db)
+
+        self.assertEqual(await self.db.server_stats.count_documents({}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
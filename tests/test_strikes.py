@@ -0,0 +1,181 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+server = pytest.importorskip("server")
+from pymongo.errors import AutoReconnect  # noqa: E402
+
+
+class UnreachableDatabase:
+    """Every write fails as if the primary were down"""
+
+    def __getitem__(self, name):
+        return self
+
+    async def insert_many(self, *args, **kwargs):
+        raise AutoReconnect("connection refused")
+
+    bulk_write = insert_many
+
+
+class UnacknowledgedDatabase:
+    """Writes land, but the connection drops before the server's reply"""
+
+    def __init__(self, database):
+        self.database = database
+
+    def __getitem__(self, name):
+        return UnacknowledgedCollection(self.database[name])
+
+
+class UnacknowledgedCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert_many(self, *args, **kwargs):
+        await self.collection.insert_many(*args, **kwargs)
+        raise AutoReconnect("connection reset")
+
+    async def bulk_write(self, *args, **kwargs):
+        await self.collection.bulk_write(*args, **kwargs)
+        raise AutoReconnect("connection reset")
+
+
+@pytest.mark.usefixtures("scratch_database")
+class StrikePersistenceTest(unittest.IsolatedAsyncioTestCase):
+    """Strikes are counted in memory and must reach Mongo through persistence_writer"""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.writer = server.PersistenceWriter(self.db, Path(self.tmp.name) / 'moderation.jsonl')
+        self.patch = mock.patch.multiple(server, persistence_writer=self.writer, strike_counts=server.StrikeCounts())
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        self.tmp.cleanup()
+
+    def strike(self, user_id="42"):
+        return server.record_strike(user_id=user_id, guild_id="1", reason="spam", moderator_id="0")
+
+    async def test_repeated_strikes_for_one_member(self):
+        strikes = 50
+        counts = [self.strike() for _ in range(strikes)]
+
+        self.assertEqual(counts, list(range(1, strikes + 1)))
+        self.assertEqual(await self.writer.flush(), ["1"])
+
+        member = await self.db.members.find_one({"user_id": "42", "guild_id": "1"})
+        self.assertEqual(member["strike_count"], strikes)
+        self.assertEqual(await self.db.strikes.count_documents({"user_id": "42", "guild_id": "1"}), strikes)
+
+    async def test_existing_member_count_is_loaded(self):
+        await self.db.members.insert_one({"user_id": "7", "guild_id": "1", "strike_count": 2})
+        await server.strike_counts.load(self.db, ["1"])
+
+        self.assertEqual(self.strike("7"), 3)
+        await self.writer.flush()
+        self.assertEqual(await self.db.members.count_documents({"user_id": "7", "guild_id": "1"}), 1)
+
+    async def test_concurrent_loads_read_each_guild_once(self):
+        await self.db.members.insert_one({"user_id": "7", "guild_id": "1", "strike_count": 2})
+
+        with mock.patch.object(server.strike_counts, '_read', wraps=server.strike_counts._read) as read:
+            await asyncio.gather(server.strike_counts.load(self.db, ["1"]), server.strike_counts.load(self.db, ["1", "2"]))
+            await server.strike_counts.load(self.db, ["1"])
+
+        self.assertEqual([call.args[1] for call in read.call_args_list], [["1"], ["2"]])
+        self.assertEqual(self.strike("7"), 3)
+
+    async def test_writes_are_journaled_while_mongo_is_down(self):
+        for _ in range(3):
+            self.strike()
+
+        self.assertEqual(await self.writer.flush(UnreachableDatabase()), [])
+        self.assertEqual(len(self.writer.journal.read_text().splitlines()), 6)
+
+        # The next flush replays the journal before its own batch
+        self.strike()
+        self.assertEqual(await self.writer.flush(), ["1"])
+
+        self.assertFalse(self.writer.journal.exists())
+        member = await self.db.members.find_one({"user_id": "42", "guild_id": "1"})
+        self.assertEqual(member["strike_count"], 4)
+        self.assertEqual(await self.db.strikes.count_documents({"guild_id": "1"}), 4)
+
+    async def test_replaying_writes_that_landed_counts_them_once(self):
+        for _ in range(2):
+            self.strike()
+
+        await self.writer.flush(UnacknowledgedDatabase(self.db))
+        self.assertTrue(self.writer.journal.exists())
+        await self.writer.flush()
+
+        member = await self.db.members.find_one({"user_id": "42", "guild_id": "1"})
+        self.assertEqual(member["strike_count"], 2)
+        self.assertEqual(await self.db.strikes.count_documents({"guild_id": "1"}), 2)
+
+    async def test_torn_journal_line_is_set_aside(self):
+        self.strike()
+        await self.writer.flush(UnreachableDatabase())
+        # The process died halfway through appending the next write
+        with open(self.writer.journal, 'a') as f:
+            f.write('{"op": "insert", "collection": "stri')
+
+        self.strike()
+        await self.writer.flush(UnreachableDatabase())
+        self.strike()
+        self.assertEqual(await self.writer.flush(), ["1"])
+
+        self.assertEqual(await self.db.strikes.count_documents({"guild_id": "1"}), 3)
+        member = await self.db.members.find_one({"user_id": "42", "guild_id": "1"})
+        self.assertEqual(member["strike_count"], 3)
+        self.assertFalse(self.writer.journal.exists())
+        self.assertIn('"stri', self.writer.journal.with_suffix('.corrupt').read_text())
+
+    async def test_failed_flush_keeps_its_batch(self):
+        self.strike()
+        self.writer.journal.write_text("")
+
+        with mock.patch.object(self.writer, '_replay', side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                await self.writer.flush()
+
+        self.assertEqual(len(self.writer._pending), 2)
+
+    async def test_replay_skips_strikes_already_written(self):
+        self.strike()
+        strike = self.writer._pending[0]['document']
+        await self.db.strikes.insert_one(strike)
+        self.writer._write_journal(self.writer._pending, 'a')
+        self.writer._pending = []
+
+        await self.writer.flush()
+
+        self.assertEqual(await self.db.strikes.count_documents({"_id": strike["_id"]}), 1)
+        self.assertFalse(self.writer.journal.exists())
+
+
+class DocumentBuilderTest(unittest.TestCase):
+    """Hot-path builders must produce the fields the API models describe"""
+
+    def assertMatchesModel(self, document, model):
+        fields = {field.alias or name for name, field in model.model_fields.items()}
+        self.assertEqual(set(document), fields)
+        self.assertIsInstance(document["_id"], server.ObjectId)
+
+    def test_strike_document(self):
+        self.assertMatchesModel(server.strike_document("1", "2", "spam", "3"), server.Strike)
+
+    def test_mod_action_document(self):
+        document = server.mod_action_document("timeout", "1", "3", "spam", "2", duration=60)
+        self.assertMatchesModel(document, server.ModAction)
+        self.assertEqual(document["duration"], 60)
+
+
+if __name__ == "__main__":
+    unittest.main()